@@ -0,0 +1,4 @@
+"""Benchmarks of the post-processing scripts, runnable without Cura.
+
+Run them from the repository root with: python -m benchmarks.run
+"""
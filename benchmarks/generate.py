@@ -0,0 +1,108 @@
+##  Generator of synthetic G-code in the format Cura produces for printers with several (virtual) extruders.
+
+from typing import List
+import random
+
+HEADER = """;FLAVOR:Marlin
+;TIME:{time}
+;Filament used: 1.5m, 0.5m
+;Layer height: 0.2
+;MINX:10
+;MINY:10
+;MINZ:0.2
+;MAXX:190
+;MAXY:190
+;MAXZ:{max_z}
+;Generated with Cura_SteamEngine 4.8.0
+"""
+
+START_GCODE = """M140 S60
+M105
+M190 S60
+M104 S200
+M105
+M109 S200
+M82 ;absolute extrusion mode
+G28 ;Home
+G1 Z15.0 F6000 ;Move the platform down 15mm
+G92 E0
+G1 F200 E3
+G92 E0
+T0
+G92 E0
+G1 F1500 E-6.5
+;LAYER_COUNT:{layers}
+"""
+
+END_GCODE = """;TIME_ELAPSED:{time}
+G1 F1500 E{e:.5f}
+M140 S0
+M107
+G91 ;Relative positioning
+G1 E-2 F2700 ;Retract a bit
+G1 E-2 Z0.2 F2400 ;Retract and raise Z
+G1 X5 Y5 F3000 ;Wipe out
+G1 Z10 ;Raise Z more
+G90 ;Absolute positioning
+M104 S0
+M140 S0
+M84 X Y E ;Disable all steppers but Z
+M82 ;absolute extrusion mode
+M104 S0
+;End of Gcode
+"""
+
+FEATURES = ["WALL-OUTER", "WALL-INNER", "SKIN", "FILL", "SUPPORT"]
+
+def generate(layers: int = 100, lines_per_layer: int = 1000, tool_changes_per_layer: float = 0.5, tools: int = 2, seed: int = 0) -> List[str]:
+    """A G-code list as Cura passes it to post-processing scripts.
+
+    The first item is the header and the second the start G-code, followed by
+    one item per layer and the end G-code. Tool changes happen at random
+    positions with the given average count per layer; like Cura, each one is
+    preceded by a retraction and followed by a reset of the extruder position
+    and sometimes a temperature change.
+    """
+    rnd = random.Random(seed)
+    layer_height = 0.2
+    data = [HEADER.format(time = layers * 60, max_z = round(layers * layer_height, 2)), START_GCODE.format(layers = layers)]
+
+    tool = 0
+    e = 0.0
+    for layer_number in range(layers):
+        z = round((layer_number + 1) * layer_height, 2)
+        lines = [";LAYER:%d" % layer_number, "M106 S255" if layer_number == 1 else "M107" if layer_number == 0 else ";MESH:part%d.stl" % tool]
+        lines.append("G0 F6000 X%.3f Y%.3f Z%s" % (rnd.uniform(10, 190), rnd.uniform(10, 190), z))
+        lines.append(";TYPE:" + FEATURES[0])
+
+        tool_change_probability = tool_changes_per_layer / lines_per_layer
+        for _ in range(lines_per_layer):
+            r = rnd.random()
+            if r < tool_change_probability:
+                tool = rnd.randrange(tools)
+                lines.append("G1 F1500 E%.5f" % (e - 6.5))
+                lines.append("T%d" % tool)
+                if rnd.random() < 0.3:
+                    lines.append("M104 T%d S%d" % (tool, rnd.choice([195, 200, 205])))
+                lines.append("G92 E0")
+                lines.append("G1 F1500 E0")
+                e = 0.0
+            elif r < 0.25:
+                lines.append("G0 F7200 X%.3f Y%.3f" % (rnd.uniform(10, 190), rnd.uniform(10, 190)))
+            elif r < 0.26:
+                lines.append(";TYPE:" + rnd.choice(FEATURES))
+            elif r < 0.265:
+                # Z hop
+                lines.append("G1 F1500 E%.5f" % (e - 6.5))
+                lines.append("G1 F300 Z%s" % round(z + 0.4, 2))
+                lines.append("G0 F7200 X%.3f Y%.3f" % (rnd.uniform(10, 190), rnd.uniform(10, 190)))
+                lines.append("G1 F300 Z%s" % z)
+                lines.append("G1 F1500 E%.5f" % e)
+            else:
+                e += rnd.uniform(0.01, 0.5)
+                lines.append("G1 X%.3f Y%.3f E%.5f" % (rnd.uniform(10, 190), rnd.uniform(10, 190), e))
+        lines.append(";TIME_ELAPSED:%.6f" % ((layer_number + 1) * 60.0))
+        data.append("\n".join(lines) + "\n")
+
+    data.append(END_GCODE.format(time = layers * 60.0, e = e - 6.5))
+    return data
@@ -0,0 +1,190 @@
+##  The line by line implementations of the scripts before they used the
+##  multicolor_single_extruder package, to check that the faster code paths
+##  produce the same G-code.
+##
+##  The only change is that the line break that used to be appended to the end
+##  of every layer (an empty line after each layer) is removed again.
+
+from typing import Any, List
+import re
+
+from . import stubs
+
+def filament_change_on_tool_change(script: Any, data: List[str]) -> List[str]:
+    """FilamentChangeOnToolChange.execute"""
+    initial_retract = script.getSettingValueByKey("initial_retract")
+    later_retract = script.getSettingValueByKey("later_retract")
+    x_pos = script.getSettingValueByKey("x_position")
+    y_pos = script.getSettingValueByKey("y_position")
+
+    filament_change = "M600"
+
+    if initial_retract is not None and initial_retract > 0.:
+        filament_change = filament_change + (" E%.2f" % -initial_retract)
+
+    if later_retract is not None and later_retract > 0.:
+        filament_change = filament_change + (" L%.2f" % later_retract)
+
+    if x_pos is not None:
+        filament_change = filament_change + (" X%.2f" % x_pos)
+
+    if y_pos is not None:
+        filament_change = filament_change + (" Y%.2f" % y_pos)
+
+    filament_change = filament_change + (" Z%.2f" % 10)
+    filament_change = filament_change + " ; Generated by FilamentChangeOnToolChange plugin\n"
+
+    tool_change_regex = re.compile("T[0-9]+")
+
+    is_first_tool_change = True     # ignore the first tool change; replace all that follow
+    for layer_number, layer in enumerate(data):
+        layer_data = ""
+        for line in layer.split("\n"):
+            if tool_change_regex.match(line):
+                if not is_first_tool_change:
+                    layer_data += filament_change
+                else:
+                    is_first_tool_change = False
+                    layer_data += line + "\n"
+            else:
+                layer_data += line + "\n"
+        data[layer_number] = layer_data[:-1]
+
+    return data
+
+def pause_at_height_on_tool_change(script: Any, data: List[str]) -> List[str]:
+    """PauseAtHeightOnToolChange.execute"""
+    disarm_timeout = script.getSettingValueByKey("disarm_timeout")
+    retraction_amount = script.getSettingValueByKey("retraction_amount")
+    unload_amount = script.getSettingValueByKey("unload_amount")
+    load_amount = script.getSettingValueByKey("load_amount")
+    retraction_speed = script.getSettingValueByKey("retraction_speed")
+    extrude_amount = script.getSettingValueByKey("extrude_amount")
+    extrude_speed = script.getSettingValueByKey("extrude_speed")
+    park_x = script.getSettingValueByKey("head_park_x")
+    park_y = script.getSettingValueByKey("head_park_y")
+    move_z = script.getSettingValueByKey("head_move_z")
+    layers_started = False
+    standby_temperature = script.getSettingValueByKey("standby_temperature")
+    firmware_retract = stubs.Application.getInstance().getGlobalContainerStack().getProperty("machine_firmware_retract", "value")
+    control_temperatures = stubs.Application.getInstance().getGlobalContainerStack().getProperty("machine_nozzle_temp_enabled", "value")
+    initial_layer_height = stubs.Application.getInstance().getGlobalContainerStack().getProperty("layer_height_0", "value")
+    display_text = script.getSettingValueByKey("display_text")
+    gcode_before = script.getSettingValueByKey("custom_gcode_before_pause")
+    gcode_after = script.getSettingValueByKey("custom_gcode_after_pause")
+    is_first_tool_change = True     # ignore the first tool change; replace all that follow
+
+    pause_method = script.getSettingValueByKey("pause_method")
+    pause_command = {
+        "marlin": script.putValue(M = 0),
+        "griffin": script.putValue(M = 0),
+        "bq": script.putValue(M = 25),
+        "reprap": script.putValue(M = 226),
+        "repetier": script.putValue("@pause now change filament and press continue printing")
+    }[pause_method]
+
+    current_z = 0
+
+    for index, layer in enumerate(data):
+        lines = layer.split("\n")
+        layer_data = ""
+
+        # Scroll each line of instruction for each layer in the G-code
+        for line in lines:
+            # If a Z instruction is in the line, read the current Z
+            if script.getValue(line, "Z") is not None:
+                current_z = script.getValue(line, "Z")
+
+            if line.startswith("T"):
+                if not is_first_tool_change:
+                    halt_gcode = ";TYPE:CUSTOM\n"
+                    halt_gcode += ";added code by post processing\n"
+                    halt_gcode += ";script: PauseAtHeightOnToolChange.py\n"
+
+                    if pause_method == "repetier":
+                        #Retraction
+                        halt_gcode += script.putValue(M = 83) + " ; switch to relative E values for any needed retraction\n"
+                        if retraction_amount != 0:
+                            halt_gcode += script.putValue(G = 1, E = retraction_amount, F = 6000) + "\n"
+
+                        #Move the head away
+                        halt_gcode += script.putValue(G = 1, Z = current_z + 1, F = 300) + " ; move up a millimeter to get out of the way\n"
+                        halt_gcode += script.putValue(G = 1, X = park_x, Y = park_y, F = 9000) + "\n"
+                        if current_z < move_z:
+                            halt_gcode += script.putValue(G = 1, Z = current_z + move_z, F = 300) + "\n"
+
+                        #Disable the E steppers
+                        halt_gcode += script.putValue(M = 84, E = 0) + "\n"
+
+                    elif pause_method != "griffin":
+                        # Retraction
+                        halt_gcode += script.putValue(M = 83) + " ; switch to relative E values for any needed retraction\n"
+                        if retraction_amount != 0:
+                            if firmware_retract: #Can't set the distance directly to what the user wants. We have to choose ourselves.
+                                retraction_count = 1 if control_temperatures else 3 #Retract more if we don't control the temperature.
+                                for i in range(retraction_count):
+                                    halt_gcode += script.putValue(G = 10) + "\n"
+                            else:
+                                halt_gcode += script.putValue(G = 1, E = -retraction_amount, F = retraction_speed * 60) + "\n"
+
+                        # Move the head away
+                        halt_gcode += script.putValue(G = 1, Z = current_z + 1, F = 300) + " ; move up a millimeter to get out of the way\n"
+
+                        # This line should be ok
+                        halt_gcode += script.putValue(G = 1, X = park_x, Y = park_y, F = 9000) + "\n"
+
+                        if current_z < 15:
+                            halt_gcode += script.putValue(G = 1, Z = 15, F = 9000) + " ; too close to bed--move to at least 15mm\n"
+
+                        if control_temperatures:
+                            # Set extruder standby temperature
+                            halt_gcode += script.putValue(M = 104, S = standby_temperature) + " ; standby temperature\n"
+
+                    if display_text:
+                        halt_gcode += "M117 " + display_text + "\n"
+
+                    # Set the disarm timeout
+                    if disarm_timeout > 0:
+                        halt_gcode += script.putValue(M = 18, S = disarm_timeout) + " ; Set the disarm timeout\n"
+
+                    # Set a custom GCODE section before pause
+                    if gcode_before:
+                        halt_gcode += gcode_before + "\n"
+
+                    tmp_unload_amount = unload_amount
+                    if tmp_unload_amount is not None:
+                        while tmp_unload_amount > 0:
+                            if tmp_unload_amount - 200 <= 0:
+                                halt_gcode += script.putValue(G = 1, E = -tmp_unload_amount, F = retraction_speed * 60) + "\n"
+                            else:
+                                halt_gcode += script.putValue(G = 1, E = -200, F = retraction_speed * 60) + "\n"
+                            tmp_unload_amount -= 200
+
+                    # Wait till the user continues printing
+                    halt_gcode += pause_command + " ; Do the actual pause\n"
+
+                    tmp_load_amount = load_amount
+                    if tmp_load_amount is not None:
+                        while tmp_load_amount > 0:
+                            if tmp_load_amount - 100 <= 0:
+                                halt_gcode += script.putValue(G = 1, E = tmp_load_amount, F = retraction_speed * 60) + "\n"
+                            else:
+                                halt_gcode += script.putValue(G = 1, E = 100, F = retraction_speed * 60) + "\n"
+                            tmp_load_amount -= 100
+
+                    # Wait till the user continues printing
+                    halt_gcode += pause_command + " ; Do the another pause\n"
+
+                    # Set a custom GCODE section after pause
+                    if gcode_after:
+                        halt_gcode += gcode_after + "\n"
+
+                    halt_gcode += script.putValue(M = 82) + "\n"
+                    layer_data += halt_gcode
+                else:
+                    is_first_tool_change = False
+                    layer_data += line + "\n"
+            else:
+                layer_data += line + "\n"
+        data[index] = layer_data[:-1]
+    return data
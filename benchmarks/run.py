@@ -0,0 +1,126 @@
+##  Measures the throughput and memory use of the post-processing scripts on
+##  synthetic G-code, for every pause method, and checks that each code path
+##  produces exactly the same G-code as the reference implementation.
+##
+##  Usage: python -m benchmarks.run [--layers N] [--lines-per-layer N] [--tool-changes-per-layer X] [--json]
+
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from . import reference, stubs
+from .generate import generate
+
+stubs.install()
+sys.path.insert(0, stubs.REPOSITORY)
+
+from multicolor_single_extruder import FILAMENT_CHANGE_SETTINGS, PAUSE_AT_HEIGHT_SETTINGS, default_settings, LayerCache, ToolChangeIndex, rewrite_cached, rewrite_file
+
+PAUSE_METHODS = ["marlin", "griffin", "bq", "reprap", "repetier"]
+
+def variants() -> Iterator[Tuple[str, str, Dict[str, Any], Callable]]:
+    """The scripts to measure: name, pause method, settings and reference implementation."""
+    # Features that change the G-code on purpose are disabled, to compare with the reference
+    unchanged = {"reorder_segments": False, "remove_redundant_tool_changes": False, "return_to_print": False}
+
+    yield "FilamentChangeOnToolChange", "", dict(default_settings(FILAMENT_CHANGE_SETTINGS), **unchanged), reference.filament_change_on_tool_change
+    for pause_method in PAUSE_METHODS:
+        settings = dict(default_settings(PAUSE_AT_HEIGHT_SETTINGS), **unchanged)
+        settings.update(pause_method = pause_method, retraction_amount = 2.0, display_text = "Change filament")
+        yield "PauseAtHeightOnToolChange", pause_method, settings, reference.pause_at_height_on_tool_change
+
+def measure(function: Callable[[List[str]], Any], data: List[str], repeat: int) -> Tuple[float, float]:
+    """The best time (s) of `repeat` runs on copies of the data, and the peak memory use (MB)."""
+    best = float("inf")
+    for _ in range(repeat):
+        copy = list(data)
+        start = time.perf_counter()
+        function(copy)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    function(list(data))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak / 1e6
+
+def check(script: Any, data: List[str], expected: List[str]) -> List[str]:
+    """The names of the code paths whose output differs from the expected output."""
+    failures = []
+    if script.execute(list(data)) != expected:
+        failures.append("execute")
+    if list(script.execute_iter(list(data))) != expected:
+        failures.append("execute_iter")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = LayerCache(directory)
+        # The second run takes every layer with tool changes from the cache
+        runs = [list(rewrite_cached(list(data), script.buildTemplate(), cache)) for _ in range(2)]
+        if runs != [expected, expected] or cache.hits != len(ToolChangeIndex(data).layers()):
+            failures.append("cache")
+
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "input.gcode")
+        output_path = os.path.join(directory, "output.gcode")
+        with open(input_path, "w", newline = "") as file:
+            file.write("".join(data))
+        rewrite_file(input_path, output_path, script.buildTemplate())
+        with open(output_path, newline = "") as file:
+            if file.read() != "".join(expected):
+                failures.append("stream")
+    return failures
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog = "python -m benchmarks.run", description = "Benchmarks the post-processing scripts on synthetic G-code and checks their output against the reference implementation.")
+    parser.add_argument("--layers", type = int, default = 200)
+    parser.add_argument("--lines-per-layer", type = int, default = 2000)
+    parser.add_argument("--tool-changes-per-layer", type = float, default = 0.2)
+    parser.add_argument("--tools", type = int, default = 3)
+    parser.add_argument("--repeat", type = int, default = 3, help = "runs per measurement, the best is reported")
+    parser.add_argument("--json", action = "store_true", help = "print the results as JSON")
+    arguments = parser.parse_args(argv)
+
+    data = generate(arguments.layers, arguments.lines_per_layer, arguments.tool_changes_per_layer, arguments.tools)
+    lines = sum(layer.count("\n") for layer in data)
+    megabytes = sum(map(len, data)) / 1e6
+
+    results = []
+    for name, pause_method, settings, implementation in variants():
+        script = stubs.load_script(name)()
+        script.settings = settings
+
+        expected = implementation(script, list(data))
+        seconds, peak = measure(script.execute, data, arguments.repeat)
+        reference_seconds, reference_peak = measure(lambda copy: implementation(script, copy), data, arguments.repeat)
+        results.append({
+            "script": name,
+            "pause_method": pause_method,
+            "lines": lines,
+            "megabytes": round(megabytes, 3),
+            "seconds": round(seconds, 4),
+            "lines_per_second": round(lines / seconds),
+            "megabytes_per_second": round(megabytes / seconds, 2),
+            "peak_megabytes": round(peak, 2),
+            "reference_seconds": round(reference_seconds, 4),
+            "reference_peak_megabytes": round(reference_peak, 2),
+            "speedup": round(reference_seconds / seconds, 2),
+            "failures": check(script, data, expected),
+        })
+
+    if arguments.json:
+        print(json.dumps(results, indent = 2))
+    else:
+        print("%d lines, %.1f MB" % (lines, megabytes))
+        print("%-28s %-9s %12s %8s %9s %8s %8s" % ("script", "method", "lines/s", "MB/s", "peak MB", "speedup", "golden"))
+        for result in results:
+            print("%-28s %-9s %12d %8.1f %9.1f %7.1fx %8s" % (result["script"], result["pause_method"], result["lines_per_second"], result["megabytes_per_second"], result["peak_megabytes"], result["speedup"], ", ".join(result["failures"]) or "ok"))
+
+    return 1 if any(result["failures"] for result in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+##  Stand-ins for the parts of Cura that the post-processing scripts import, so
+##  the scripts can be loaded and measured without a Cura installation.
+
+from typing import Any, Dict, Type
+import importlib.util
+import os
+import re
+import sys
+import types
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+##  The printer properties returned by the global container stack.
+MACHINE_PROPERTIES = {
+    "machine_name": "Unknown",
+    "machine_gcode_flavor": "RepRap (Marlin/Sprinter)",
+    "machine_firmware_retract": False,
+    "machine_nozzle_temp_enabled": True,
+    "layer_height_0": 0.2,
+}
+
+class Script:
+    """The methods of Cura's Script class that the scripts use; settings come from a dict."""
+
+    def __init__(self) -> None:
+        self._instance = None
+        self.settings: Dict[str, Any] = {}
+
+    def initialize(self) -> None:
+        pass
+
+    def getSettingValueByKey(self, key: str) -> Any:
+        return self.settings[key]
+
+    def getValue(self, line: str, key: str, default = None) -> Any:
+        if not key in line or (";" in line and line.find(key) > line.find(";")):
+            return default
+        sub_part = line[line.find(key) + 1:]
+        m = re.search("^-?[0-9]+\\.?[0-9]*", sub_part)
+        if m is None:
+            return default
+        try:
+            return int(m.group(0))
+        except ValueError: #Not an integer.
+            try:
+                return float(m.group(0))
+            except ValueError: #Not a number at all.
+                return default
+
+    def putValue(self, line: str = "", **kwargs) -> str:
+        # Strip the comment.
+        if ";" in line:
+            comment = line[line.find(";"):]
+            line = line[:line.find(";")]
+        else:
+            comment = ""
+
+        # Parse the original g-code line and add them to kwargs.
+        for part in line.split(" "):
+            if part == "":
+                continue
+            parameter = part[0]
+            if parameter not in kwargs:
+                kwargs[parameter] = part[1:]
+
+        # Start writing the new g-code line.
+        line_parts = []
+        for parameter in ["G", "M", "T", "S", "F", "X", "Y", "Z", "E"]:
+            if parameter in kwargs:
+                line_parts.append(parameter + str(kwargs.pop(parameter)))
+        for parameter, value in kwargs.items():
+            line_parts.append(parameter + str(value))
+
+        if comment != "":
+            line_parts.append(comment)
+        return " ".join(line_parts)
+
+class GlobalContainerStack:
+    def getProperty(self, key: str, property_name: str) -> Any:
+        return MACHINE_PROPERTIES[key]
+
+class Application:
+    @classmethod
+    def getInstance(cls) -> "Application":
+        return cls()
+
+    def getGlobalContainerStack(self) -> GlobalContainerStack:
+        return GlobalContainerStack()
+
+class Logger:
+    @staticmethod
+    def log(log_type: str, message: str) -> None:
+        pass
+
+    @staticmethod
+    def logException(log_type: str, message: str) -> None:
+        pass
+
+def _module(name: str, package: bool = False, **attributes) -> types.ModuleType:
+    module = types.ModuleType(name)
+    if package:
+        module.__path__ = []
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+def install() -> None:
+    """Registers the stand-ins as the PostProcessingPlugin and UM modules."""
+    _module("PostProcessingPlugin", package = True)
+    _module("PostProcessingPlugin.Script", Script = Script)
+    _module("PostProcessingPlugin.scripts", package = True)
+    _module("UM", package = True)
+    _module("UM.Application", Application = Application)
+    _module("UM.Logger", Logger = Logger)
+
+def load_script(name: str) -> Type:
+    """Loads a script of the repository the way Cura does, returning its class."""
+    install()
+    spec = importlib.util.spec_from_file_location("PostProcessingPlugin.scripts." + name, os.path.join(REPOSITORY, name + ".py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, name)
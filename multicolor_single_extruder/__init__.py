@@ -0,0 +1,21 @@
+"""Helpers shared by the multicolor single extruder post-processing scripts.
+
+The modules in this package do not depend on Cura, so they can be used by the
+scripts inside Cura as well as on their own.
+"""
+
+from .cache import Halt, LayerCache, layer_halts, rewrite_cached
+from .elimination import ToolStateTracker, redundant_tool_changes
+from .gcode import put_value
+from .halt import HaltTemplate, build_filament_change_template, build_pause_template
+from .index import TOOL_CHANGE_LINE, ToolChange, ToolChangeIndex, scan_layer
+from .pipeline import prefetch
+from .profiling import Profiler
+from .reheat import last_temperature, reheat_seconds_saved, tool_change_temperatures
+from .reorder import SegmentReorderer, reorder_segments
+from .rewrite import LayerState, iter_rewrite_halts, render_halt, resume_position, rewrite_halts, rewrite_tool_changes, splice
+from .script import ToolChangeScript
+from .settings import FILAMENT_CHANGE_SETTINGS, PAUSE_AT_HEIGHT_SETTINGS, default_settings
+from .strip import RegionStripper, strip_regions
+from .stream import iter_layers, read_layers, rewrite_file
+from .zindex import LayerValueIndex, LayerZIndex, last_z, next_position
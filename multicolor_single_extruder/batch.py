@@ -0,0 +1,164 @@
+##  Runs a post-processing script on many G-code files at once, for print farms.
+##
+##  Usage: python -m multicolor_single_extruder.batch pause jobs/ --profile farm.json --output-dir out/
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+from .cli import SCRIPTS, process_file, script_settings
+from .settings import parse_setting
+
+##  The extension of the G-code files that are taken from an input directory.
+GCODE_EXTENSION = ".gcode"
+
+def find_inputs(patterns: List[str]) -> List[str]:
+    """The G-code files in the given directories, or matched by the given file names or glob patterns, without duplicates."""
+    paths: List[str] = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(glob.escape(pattern), "*" + GCODE_EXTENSION))
+        else:
+            matches = glob.glob(pattern, recursive = True)
+        for path in sorted(matches):
+            if os.path.isfile(path) and path not in paths:
+                paths.append(path)
+    return paths
+
+def load_profile(script: str, path: Optional[str]) -> Dict[str, Any]:
+    """The setting values of a script, with the values of a JSON settings profile over the defaults.
+
+    The values of the profile are converted to the types of the settings, so
+    they may also be given as strings, like Cura stores them.
+    """
+    settings = script_settings(script)
+    if path is None:
+        return settings
+
+    with open(path) as profile_file:
+        profile = json.load(profile_file)
+    if not isinstance(profile, dict):
+        raise ValueError("The settings profile %s is not a JSON object" % path)
+    unknown = sorted(set(profile) - set(settings))
+    if unknown:
+        raise ValueError("Unknown settings in %s: %s" % (path, ", ".join(unknown)))
+
+    setting_data, _ = SCRIPTS[script]
+    definitions = json.loads(setting_data)["settings"]
+    for key, value in profile.items():
+        # The printer properties are not script settings; they are all booleans
+        definition = definitions.get(key, {"type": "bool"})
+        try:
+            settings[key] = parse_setting(definition, value)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid value for %s in %s: %r" % (key, path, value))
+        if "options" in definition and settings[key] not in definition["options"]:
+            raise ValueError("Invalid value for %s in %s: %r (one of %s)" % (key, path, value, ", ".join(definition["options"])))
+    return settings
+
+def process_job(job: Tuple[str, Dict[str, Any], str, str]) -> Dict[str, Any]:
+    """Processes one file in a worker process, returning its statistics.
+
+    Errors are reported in the statistics instead of raised, so one broken
+    file doesn't stop the batch.
+    """
+    script, settings, input_path, output_path = job
+    messages: List[str] = []
+    stats: Dict[str, Any] = {"input": input_path, "output": output_path, "ok": False}
+    start = time.perf_counter()
+    try:
+        size = os.path.getsize(input_path)
+        stats.update(process_file(script, settings, input_path, output_path, messages.append))
+    except Exception as e:
+        stats["error"] = "%s: %s" % (type(e).__name__, e)
+    else:
+        stats["ok"] = True
+        stats["bytes"] = size
+    seconds = time.perf_counter() - start
+    stats["seconds"] = round(seconds, 3)
+    if stats["ok"]:
+        stats["megabytes_per_second"] = round(size / 1e6 / seconds, 2) if seconds > 0 else None
+    stats["messages"] = messages
+    return stats
+
+def run_batch(script: str, settings: Dict[str, Any], inputs: List[str], output_directory: str, workers: Optional[int] = None) -> Dict[str, Any]:
+    """Processes G-code files in a pool of worker processes, writing the outputs with the same names into a directory.
+
+    Every worker streams its file, so its memory use is bounded by the size
+    of a few layers and does not depend on the size of the file. Outputs are
+    written to a temporary file first and then renamed, so a failed or
+    interrupted file never leaves a partial output behind. Returns the
+    statistics of every file and their totals.
+    """
+    os.makedirs(output_directory, exist_ok = True)
+    jobs = []
+    for input_path in inputs:
+        output_path = os.path.join(output_directory, os.path.basename(input_path))
+        if os.path.exists(output_path) and os.path.samefile(input_path, output_path):
+            raise ValueError("The output directory contains the input file %s" % input_path)
+        jobs.append((script, settings, input_path, output_path))
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers = workers) as executor:
+        files = list(executor.map(process_job, jobs))
+    seconds = time.perf_counter() - start
+
+    processed = [stats for stats in files if stats["ok"]]
+    total_bytes = sum(stats["bytes"] for stats in processed)
+    return {
+        "files": files,
+        "total": {
+            "files": len(files),
+            "failed": len(files) - len(processed),
+            "bytes": total_bytes,
+            "seconds": round(seconds, 3),
+            "megabytes_per_second": round(total_bytes / 1e6 / seconds, 2) if seconds > 0 else None,
+            "tool_changes": sum(stats["tool_changes"] for stats in processed),
+            "halts": sum(stats["halts"] for stats in processed),
+            "removed_tool_changes": sum(stats["removed_tool_changes"] for stats in processed),
+        },
+    }
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog = "python -m multicolor_single_extruder.batch", description = "Runs a post-processing script on many G-code files in parallel and reports statistics as JSON.")
+    parser.add_argument("script", choices = list(SCRIPTS), help = "the script to run")
+    parser.add_argument("inputs", nargs = "+", help = "directories of G-code files, G-code files or glob patterns (quoted, to keep the shell from expanding them)")
+    parser.add_argument("--output-dir", required = True, help = "directory to write the output files to, with the names of the input files")
+    parser.add_argument("--profile", help = "JSON file with setting values, for example {\"pause_method\": \"marlin\"}; other settings keep their defaults")
+    parser.add_argument("--workers", type = int, help = "number of worker processes (default: the number of CPUs)")
+    parser.add_argument("--stats", help = "file to write the statistics to (default: standard output)")
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    arguments = parser.parse_args(argv)
+    if arguments.workers is not None and arguments.workers < 1:
+        parser.error("the number of workers has to be at least 1")
+
+    inputs = find_inputs(arguments.inputs)
+    if not inputs:
+        parser.error("no G-code files found")
+    names = [os.path.basename(path) for path in inputs]
+    if len(set(names)) < len(names):
+        parser.error("the input files have to have different names, since all outputs are written to one directory")
+    try:
+        settings = load_profile(arguments.script, arguments.profile)
+        stats = run_batch(arguments.script, settings, inputs, arguments.output_dir, arguments.workers)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    report = json.dumps(stats, indent = 2)
+    if arguments.stats is None:
+        print(report)
+    else:
+        with open(arguments.stats, "w") as stats_file:
+            stats_file.write(report + "\n")
+    return 1 if stats["total"]["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+from typing import AbstractSet, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+import hashlib
+import json
+import os
+import tempfile
+
+from .halt import HaltTemplate
+from .index import ToolChange, scan_layer
+from .reheat import last_temperature
+from .rewrite import LayerState, resume_position, splice
+from .zindex import last_z
+
+##  The cache is trimmed to this size (in bytes) after each run.
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+##  Layers are hashed with the same encoding as G-code files.
+ENCODING = "utf-8"
+ENCODING_ERRORS = "surrogateescape"
+
+class Halt(NamedTuple):
+    """Where a halt block goes in a layer, and the values it is rendered with."""
+    start: int
+    end: int
+    z: Union[int, float] = 0
+    temperature: Optional[Union[int, float]] = None
+    resume: Optional[Tuple[Union[int, float], Union[int, float]]] = None
+    removed: bool = False       # whether the tool change is removed instead
+
+def default_cache_directory() -> str:
+    """The cache directory of the user, as used by most Linux programs."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "multicolor_single_extruder")
+
+class LayerCache:
+    """Where the halt blocks of rewritten layers go, on disk, keyed by the layer and its starting state.
+
+    Only layers with tool changes are cached, since the rewrite returns the
+    others as they are. An entry holds the offsets of the tool changes and
+    the Z, print temperature and resume position their halt blocks are
+    rendered with, not the rendered blocks, so the entries don't depend on
+    the settings and are reused when only the halt block changes. Every
+    layer is stored in its own file. Reading a layer updates its
+    modification time, so trim() can remove the least recently used layers
+    first.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_size: int = DEFAULT_CACHE_SIZE) -> None:
+        self.directory = default_cache_directory() if directory is None else directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok = True)
+
+    def key(self, layer: str, state: LayerState, template: HaltTemplate, removed: Iterable[int] = ()) -> str:
+        """The key of a layer that starts in `state`, with the tool changes at the offsets in `removed` removed.
+
+        Of the template, only whether it resumes at the print position and
+        whether it reheats are part of the key, as they decide which values
+        are looked up.
+        """
+        digest = hashlib.blake2b(layer.encode(ENCODING, ENCODING_ERRORS))
+        digest.update(repr((tuple(state), sorted(removed), template.resume_line is not None, template.reheat_line is not None)).encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str) -> Optional[List[Halt]]:
+        """The halts stored under the key, or None."""
+        path = self._path(key)
+        try:
+            with open(path) as cached:
+                halts = [_parse_halt(*halt) for halt in json.load(cached)]
+            os.utime(path)
+        except FileNotFoundError:   # also if another run trims the layer meanwhile
+            halts = None
+        except (TypeError, ValueError):
+            # Written by an older version
+            halts = None
+        if halts is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return halts
+
+    def put(self, key: str, halts: List[Halt]) -> None:
+        """Stores the halts of a layer under the key."""
+        # Write to a temporary file first, so other runs never read a partial layer
+        handle, temporary_path = tempfile.mkstemp(dir = self.directory, suffix = ".tmp")
+        with open(handle, "w") as cached:
+            json.dump(halts, cached)
+        os.replace(temporary_path, self._path(key))
+
+    def trim(self) -> None:
+        """Removes the least recently used layers until the cache fits into max_size.
+
+        The size of an entry is the disk space it takes up, which is at least
+        a block, not the length of the file.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                status = entry.stat()
+                entries.append((status.st_mtime, _disk_usage(status), entry.path))
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+def _parse_halt(start: int, end: int, z: Union[int, float], temperature: Optional[Union[int, float]], resume: Optional[List[Union[int, float]]], removed: bool) -> Halt:
+    # JSON turns the resume position into a list
+    return Halt(start, end, z, temperature, None if resume is None else (resume[0], resume[1]), removed)
+
+def _disk_usage(status: os.stat_result) -> int:
+    # st_blocks counts 512-byte blocks; it is missing on Windows
+    blocks = getattr(status, "st_blocks", None)
+    return status.st_size if blocks is None else blocks * 512
+
+def layer_halts(layer: str, changes: List[ToolChange], template: HaltTemplate, state: LayerState, removed: Iterable[int] = ()) -> List[Halt]:
+    """The halts of the tool changes of a layer that starts in `state`, the ones at the offsets in `removed` without values."""
+    halts = []
+    for change in changes[0 if state.tool_changed else 1:]:
+        if change.start in removed:
+            halts.append(Halt(change.start, change.end, removed = True))
+            continue
+        z = last_z(layer, change.start)
+        temperature = last_temperature(layer, change.start) if template.reheat_line is not None else None
+        resume = resume_position(layer, change) if template.resume_line is not None else None
+        halts.append(Halt(change.start, change.end, state.z if z is None else z, state.temperature if temperature is None else temperature, resume))
+    return halts
+
+def rewrite_cached(layers: Iterable[str], template: HaltTemplate, cache: LayerCache, state: LayerState = LayerState(), removed: AbstractSet[Tuple[int, int]] = frozenset()) -> Iterator[str]:
+    """Like iter_rewrite_halts, but takes the halts of layers whose key is in the cache from there.
+
+    The key of a layer includes the state at its start, so a layer is only
+    reused if it would be rewritten the same way. The cache is trimmed once
+    all layers have been yielded.
+    """
+    removed_offsets: Dict[int, list] = {}
+    for layer_number, offset in removed:
+        removed_offsets.setdefault(layer_number, []).append(offset)
+
+    tool_changed, z, temperature = state
+    for layer_number, layer in enumerate(layers):
+        result = layer
+        changes = scan_layer(layer_number, layer)
+        if changes:
+            offsets = removed_offsets.get(layer_number, [])
+            layer_state = LayerState(tool_changed, z, temperature)
+            key = cache.key(layer, layer_state, template, offsets)
+            halts = cache.get(key)
+            if halts is None:
+                halts = layer_halts(layer, changes, template, layer_state, offsets)
+                cache.put(key, halts)
+            result = splice(layer, [(halt.start, halt.end, "" if halt.removed else template.render(halt.z, halt.resume, halt.temperature)) for halt in halts])
+            tool_changed = True
+        yield result
+
+        layer_z = last_z(layer)
+        if layer_z is not None:
+            z = layer_z
+        if template.reheat_line is not None:
+            layer_temperature = last_temperature(layer)
+            if layer_temperature is not None:
+                temperature = layer_temperature
+    cache.trim()
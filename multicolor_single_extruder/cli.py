@@ -0,0 +1,160 @@
+##  Command line interface to run the post-processing scripts on G-code files without Cura.
+##
+##  Usage: python -m multicolor_single_extruder pause in.gcode out.gcode --method marlin
+
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import argparse
+import json
+import os
+import sys
+
+from .elimination import redundant_tool_changes
+from .halt import build_filament_change_template, build_pause_template
+from .profiling import Profiler
+from .settings import FILAMENT_CHANGE_SETTINGS, PAUSE_AT_HEIGHT_SETTINGS, default_settings, parse_setting
+from .reheat import reheat_seconds_saved, tool_change_temperatures
+from .reorder import SegmentReorderer
+from .stream import read_layers, rewrite_file
+from .strip import RegionStripper
+
+##  The scripts that can be run: their setting definitions and how to build their halt block.
+SCRIPTS = {
+    "pause": (PAUSE_AT_HEIGHT_SETTINGS, build_pause_template),
+    "filament-change": (FILAMENT_CHANGE_SETTINGS, build_filament_change_template),
+}
+
+##  The printer properties that PauseAtHeightOnToolChange reads from Cura, with their help text.
+MACHINE_SETTINGS = {
+    "machine_firmware_retract": (False, "Whether the printer uses firmware retraction (G10)."),
+    "machine_nozzle_temp_enabled": (True, "Whether the G-code controls the nozzle temperature."),
+}
+
+##  Shorter option names for some settings.
+ALIASES = {
+    "pause_method": ["--method"],
+}
+
+def add_setting_arguments(parser: argparse.ArgumentParser, setting_data: str) -> None:
+    """Adds an option for every visible setting of a setting data string."""
+    for key, definition in json.loads(setting_data)["settings"].items():
+        if definition.get("enabled") is False:
+            continue
+
+        names = ["--" + key.replace("_", "-")] + ALIASES.get(key, [])
+        help_text = definition["description"] + " (default: %(default)s)"
+        if definition["type"] == "bool":
+            parser.add_argument(*names, dest = key, action = argparse.BooleanOptionalAction, help = help_text)
+        elif definition["type"] == "enum":
+            parser.add_argument(*names, dest = key, choices = list(definition["options"]), help = help_text)
+        else:
+            parser.add_argument(*names, dest = key, type = lambda value, definition = definition: parse_setting(definition, value), metavar = definition["type"].upper(), help = help_text)
+    parser.set_defaults(**default_settings(setting_data))
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog = "python -m multicolor_single_extruder", description = "Replaces the tool changes of G-code sliced for virtual extruders by filament changes.")
+    subparsers = parser.add_subparsers(dest = "script", required = True)
+    for name, (setting_data, _) in SCRIPTS.items():
+        subparser = subparsers.add_parser(name, help = json.loads(setting_data)["name"])
+        subparser.add_argument("input", help = "G-code file to read")
+        subparser.add_argument("output", help = "G-code file to write")
+        add_setting_arguments(subparser, setting_data)
+        subparser.add_argument("--cprofile", metavar = "FILE", help = "profile the run with cProfile and write the statistics to FILE, for pstats or snakeviz (implies --measure-performance)")
+        if name == "pause":
+            for key, (default, help_text) in MACHINE_SETTINGS.items():
+                subparser.add_argument("--" + key.replace("_", "-"), dest = key, default = default, action = argparse.BooleanOptionalAction, help = help_text)
+    return parser
+
+def script_settings(script: str) -> Dict[str, Any]:
+    """The default values of the settings of a script, including the printer properties it reads."""
+    setting_data, _ = SCRIPTS[script]
+    settings = default_settings(setting_data)
+    if script == "pause":
+        settings.update((key, default) for key, (default, _) in MACHINE_SETTINGS.items())
+    return settings
+
+def process_file(script: str, settings: Dict[str, Any], input_path: str, output_path: str, log: Callable[[str], None] = lambda message: None, cprofile_path: Optional[str] = None) -> Dict[str, Any]:
+    """Runs a script with the given setting values on a G-code file.
+
+    Messages about what the passes changed are passed to `log`. Returns the
+    number of tool changes, of halt blocks written and of redundant tool
+    changes removed, and the performance measurements if measure_performance
+    is set or a cProfile statistics file is given.
+    """
+    _, build_template = SCRIPTS[script]
+    profiler = Profiler(settings["measure_performance"], cprofile = cprofile_path is not None)
+    profiler.start()
+
+    def reorderer() -> Optional[SegmentReorderer]:
+        return SegmentReorderer() if settings["reorder_segments"] else None
+
+    def stripper() -> Optional[RegionStripper]:
+        return RegionStripper() if settings["strip_prime_tower"] else None
+
+    def layers() -> Iterable[str]:
+        """The layers as they are rewritten, for the passes before the rewrite."""
+        return read_layers(input_path, reorderer(), stripper())
+
+    removed = set()
+    if settings["remove_redundant_tool_changes"]:
+        with profiler.phase("redundant"):
+            removed = redundant_tool_changes(layers())
+        log("Removed %d redundant tool changes" % len(removed))
+
+    header = ""
+    if settings["color_report"]:
+        # NumPy is only needed for the report
+        from .report import ColorReport
+        with profiler.phase("report"):
+            report = ColorReport().analyze(layers(), removed)
+            header = report.to_comment()
+            temporary_path = "%s.json.%d.tmp" % (output_path, os.getpid())
+            with open(temporary_path, "w") as sidecar:
+                sidecar.write(report.to_json())
+            os.replace(temporary_path, output_path + ".json")
+        log("Wrote the filament usage report to %s.json" % output_path)
+
+    with profiler.phase("template"):
+        template = build_template(settings)
+    if template.reheat_line is not None:
+        with profiler.phase("reheat"):
+            temperatures = tool_change_temperatures(layers(), removed)
+            saved = reheat_seconds_saved(temperatures, settings["standby_temperature"])
+        log("Reheating during %d pauses saves about %d seconds" % (len(temperatures), saved))
+
+    segment_reorderer = reorderer()
+    region_stripper = stripper()
+    tool_changes = rewrite_file(input_path, output_path, template, removed, segment_reorderer, header, stripper = region_stripper, profiler = profiler)
+    profiler.removed_tool_changes = len(removed)
+    profiler.stop()
+    if region_stripper is not None:
+        log("Removed %d prime tower and ooze shield regions, saving %.1f mm of filament and %d seconds" % (region_stripper.regions, region_stripper.extruded, region_stripper.seconds))
+    if segment_reorderer is not None:
+        log("Reordering extruder segments saved %d tool changes" % segment_reorderer.saved)
+
+    # The first tool change selects the initial extruder and is kept
+    stats: Dict[str, Any] = {
+        "tool_changes": tool_changes,
+        "halts": max(tool_changes - 1 - len(removed), 0),
+        "removed_tool_changes": len(removed),
+    }
+    if profiler.enabled:
+        stats["performance"] = profiler.to_dict()
+        log("Performance: %s" % profiler.to_json())
+    if cprofile_path is not None:
+        profiler.dump_stats(cprofile_path)
+        log("Wrote the cProfile statistics to %s" % cprofile_path)
+    return stats
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    arguments = parser.parse_args(argv)
+    if os.path.exists(arguments.output) and os.path.samefile(arguments.input, arguments.output):
+        parser.error("the output file has to be different from the input file")
+
+    settings: Dict[str, Any] = vars(arguments)
+    script = settings.pop("script")
+    input_path = settings.pop("input")
+    output_path = settings.pop("output")
+    cprofile_path = settings.pop("cprofile")
+    process_file(script, settings, input_path, output_path, lambda message: print(message, file = sys.stderr), cprofile_path)
+    return 0
@@ -0,0 +1,71 @@
+from typing import Iterable, List, Optional, Set, Tuple
+import re
+
+from .index import ToolChange, ToolChangeIndex, scan_layer
+
+##  A move that extrudes: G1, G2 or G3 with an X or Y word and an E word before any comment.
+##  Retractions and primes (E without X or Y) don't count, neither do travel moves (G0).
+EXTRUDING_MOVE = re.compile(r"^G[123](?=[^;\n]*[ \t][XY])(?=[^;\n]*[ \t]E)", re.MULTILINE)
+
+class ToolStateTracker:
+    """Follows the active tool through the G-code to find tool changes that change nothing.
+
+    A tool change is redundant if it selects the tool that is already active,
+    or if no extruding move follows it before the next tool change (or the end
+    of the G-code). The first tool change selects the initial tool and is never
+    redundant. Whether a tool change is redundant is decided at the first
+    extruding move after it, so the layers can be added one by one.
+    """
+
+    def __init__(self) -> None:
+        self.active_tool: Optional[int] = None
+        self.redundant: Set[Tuple[int, int]] = set()    # (layer number, offset) of the redundant tool changes
+        self._pending: Optional[ToolChange] = None
+
+    def add_layer(self, layer_number: int, layer: str, changes: Optional[List[ToolChange]] = None) -> None:
+        """Follows the tool changes and extruding moves of the next layer.
+
+        `changes` are the tool changes of the layer, if they are already known.
+        """
+        if changes is None:
+            changes = scan_layer(layer_number, layer)
+        position = 0
+        for change in changes:
+            self._follow_moves(layer, position, change.start)
+            self._change_tool(change)
+            position = change.end
+        self._follow_moves(layer, position, len(layer))
+
+    def finish(self) -> Set[Tuple[int, int]]:
+        """The redundant tool changes, once all layers have been added."""
+        if self._pending is not None:
+            self.redundant.add((self._pending.layer, self._pending.start))
+            self._pending = None
+        return self.redundant
+
+    def _follow_moves(self, layer: str, start: int, end: int) -> None:
+        if self._pending is None or EXTRUDING_MOVE.search(layer, start, end) is None:
+            return
+
+        if self._pending.tool == self.active_tool:
+            self.redundant.add((self._pending.layer, self._pending.start))
+        else:
+            self.active_tool = self._pending.tool
+        self._pending = None
+
+    def _change_tool(self, change: ToolChange) -> None:
+        if self.active_tool is None:
+            self.active_tool = change.tool
+            return
+
+        if self._pending is not None:
+            # Nothing was extruded since the previous tool change
+            self.redundant.add((self._pending.layer, self._pending.start))
+        self._pending = change
+
+def redundant_tool_changes(layers: Iterable[str], index: Optional[ToolChangeIndex] = None) -> Set[Tuple[int, int]]:
+    """The (layer number, offset) of the tool changes that change nothing."""
+    tracker = ToolStateTracker()
+    for layer_number, layer in enumerate(layers):
+        tracker.add_layer(layer_number, layer, None if index is None else index.in_layer(layer_number))
+    return tracker.finish()
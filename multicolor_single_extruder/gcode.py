@@ -0,0 +1,33 @@
+def put_value(line: str = "", **kwargs) -> str:
+    """Produces a line of G-code, like Script.putValue does in Cura.
+
+    The parameters of `line` that are not given as keyword arguments are kept.
+    """
+    # Strip the comment.
+    if ";" in line:
+        comment = line[line.find(";"):]
+        line = line[:line.find(";")]
+    else:
+        comment = ""
+
+    # Parse the original g-code line and add them to kwargs.
+    for part in line.split(" "):
+        if part == "":
+            continue
+        parameter = part[0]
+        if parameter not in kwargs:
+            kwargs[parameter] = part[1:]
+
+    # First add these parameters in order, then the rest of the parameters
+    line_parts = []
+    for parameter in ["G", "M", "T", "S", "F", "X", "Y", "Z", "E"]:
+        if parameter in kwargs:
+            line_parts.append(parameter + str(kwargs.pop(parameter)))
+    for parameter, value in kwargs.items():
+        line_parts.append(parameter + str(value))
+
+    # If there was a comment, put it at the end.
+    if comment != "":
+        line_parts.append(comment)
+
+    return " ".join(line_parts)
@@ -0,0 +1,222 @@
+from typing import Any, Callable, Mapping, Optional, Tuple
+
+from .gcode import put_value
+
+##  Placeholders for the Z value, the X and Y of the resume position and the print temperature in a template line.
+Z_VALUE = "{0}"
+X_VALUE = "{1}"
+Y_VALUE = "{2}"
+TEMPERATURE_VALUE = "{3}"
+
+class HaltTemplate:
+    """The G-code that replaces a tool change, built once from the settings.
+
+    Only the lines that depend on the current Z are left open: the Z-lift line
+    and the optional clearance line, which is added when the current Z is below
+    `clearance_below`. Their Z value is the current Z plus 1 mm or plus
+    `clearance_offset`. Rendering a tool change just fills in these values.
+
+    The tail is followed by the `pause` and the `load` part. If there are
+    reheat lines, the nozzle is heated back to the print temperature before
+    the pause and waited for before the load part, when that temperature is
+    known; the `standby_line` before the tail, which would cool the nozzle
+    down during the pause, is then left out. If there is a `resume_line`, it
+    is added before the `end` when the position where the print resumes is
+    known, to move the head back there at the current Z.
+    """
+
+    def __init__(self, head: str, lift_line: Optional[str] = None, park: str = "", clearance_line: Optional[str] = None, clearance_below: float = 0, clearance_offset: float = 0, tail: str = "", resume_line: Optional[str] = None, end: str = "", pause: str = "", load: str = "", reheat_line: Optional[str] = None, reheat_wait_line: Optional[str] = None, standby_line: str = "") -> None:
+        self.head = head
+        self.lift_line = lift_line
+        self.park = park
+        self.clearance_line = clearance_line
+        self.clearance_below = clearance_below
+        self.clearance_offset = clearance_offset
+        self.tail = tail
+        self.resume_line = resume_line
+        self.end = end
+        self.pause = pause
+        self.load = load
+        self.reheat_line = reheat_line
+        self.reheat_wait_line = reheat_wait_line
+        self.standby_line = standby_line
+
+    def render(self, current_z: float = 0, resume: Optional[Tuple[float, float]] = None, temperature: Optional[float] = None) -> str:
+        """The halt block for a tool change at the given Z and print temperature, resuming at the given X and Y."""
+        parts = [self.head]
+        if self.lift_line is not None:
+            parts.append(self.lift_line.format(current_z + 1))
+            parts.append(self.park)
+            if self.clearance_line is not None and current_z < self.clearance_below:
+                parts.append(self.clearance_line.format(current_z + self.clearance_offset))
+
+        reheat = self.reheat_line is not None and temperature is not None
+        if not reheat:
+            parts.append(self.standby_line)
+        parts.append(self.tail)
+
+        if reheat:
+            parts.append(self.reheat_line.format(current_z, 0, 0, temperature))
+        parts.append(self.pause)
+        if reheat:
+            parts.append(self.reheat_wait_line.format(current_z, 0, 0, temperature))
+        parts.append(self.load)
+
+        if self.resume_line is not None and resume is not None:
+            parts.append(self.resume_line.format(current_z, *resume))
+        parts.append(self.end)
+        return "".join(parts)
+
+def build_filament_change_template(settings: Mapping[str, Any]) -> HaltTemplate:
+    """The M600 line of FilamentChangeOnToolChange."""
+    initial_retract = settings["initial_retract"]
+    later_retract = settings["later_retract"]
+    x_pos = settings["x_position"]
+    y_pos = settings["y_position"]
+
+    filament_change = "M600"
+
+    if initial_retract is not None and initial_retract > 0.:
+        filament_change = filament_change + (" E%.2f" % -initial_retract)
+
+    if later_retract is not None and later_retract > 0.:
+        filament_change = filament_change + (" L%.2f" % later_retract)
+
+    if x_pos is not None:
+        filament_change = filament_change + (" X%.2f" % x_pos)
+
+    if y_pos is not None:
+        filament_change = filament_change + (" Y%.2f" % y_pos)
+
+    filament_change = filament_change + (" Z%.2f" % 10)
+    filament_change = filament_change + " ; Generated by FilamentChangeOnToolChange plugin\n"
+    return HaltTemplate(filament_change)
+
+def build_pause_template(settings: Mapping[str, Any], put_value: Callable[..., str] = put_value) -> HaltTemplate:
+    """The pause block of PauseAtHeightOnToolChange, for every pause method.
+
+    Besides the script settings, `settings` holds the machine_firmware_retract
+    and machine_nozzle_temp_enabled properties of the printer. If the
+    return_to_print or reheat_during_pause settings are not in `settings`,
+    the head is not moved back and the nozzle is not reheated.
+    """
+    disarm_timeout = settings["disarm_timeout"]
+    retraction_amount = settings["retraction_amount"]
+    unload_amount = settings["unload_amount"]
+    load_amount = settings["load_amount"]
+    retraction_speed = settings["retraction_speed"]
+    park_x = settings["head_park_x"]
+    park_y = settings["head_park_y"]
+    move_z = settings["head_move_z"]
+    standby_temperature = settings["standby_temperature"]
+    firmware_retract = settings["machine_firmware_retract"]
+    control_temperatures = settings["machine_nozzle_temp_enabled"]
+    display_text = settings["display_text"]
+    gcode_before = settings["custom_gcode_before_pause"]
+    gcode_after = settings["custom_gcode_after_pause"]
+
+    pause_method = settings["pause_method"]
+    pause_command = {
+        "marlin": put_value(M = 0),
+        "griffin": put_value(M = 0),
+        "bq": put_value(M = 25),
+        "reprap": put_value(M = 226),
+        "repetier": put_value("@pause now change filament and press continue printing")
+    }[pause_method]
+
+    template = HaltTemplate(";TYPE:CUSTOM\n;added code by post processing\n;script: PauseAtHeightOnToolChange.py\n")
+
+    if pause_method == "repetier":
+        #Retraction
+        template.head += put_value(M = 83) + " ; switch to relative E values for any needed retraction\n"
+        if retraction_amount != 0:
+            template.head += put_value(G = 1, E = retraction_amount, F = 6000) + "\n"
+
+        #Move the head away
+        template.lift_line = put_value(G = 1, Z = Z_VALUE, F = 300) + " ; move up a millimeter to get out of the way\n"
+        template.park = put_value(G = 1, X = park_x, Y = park_y, F = 9000) + "\n"
+        template.clearance_line = put_value(G = 1, Z = Z_VALUE, F = 300) + "\n"
+        template.clearance_below = move_z
+        template.clearance_offset = move_z
+
+        #Disable the E steppers
+        template.tail += put_value(M = 84, E = 0) + "\n"
+
+    elif pause_method != "griffin":
+        # Retraction
+        template.head += put_value(M = 83) + " ; switch to relative E values for any needed retraction\n"
+        if retraction_amount != 0:
+            if firmware_retract: #Can't set the distance directly to what the user wants. We have to choose ourselves.
+                retraction_count = 1 if control_temperatures else 3 #Retract more if we don't control the temperature.
+                for i in range(retraction_count):
+                    template.head += put_value(G = 10) + "\n"
+            else:
+                template.head += put_value(G = 1, E = -retraction_amount, F = retraction_speed * 60) + "\n"
+
+        # Move the head away
+        template.lift_line = put_value(G = 1, Z = Z_VALUE, F = 300) + " ; move up a millimeter to get out of the way\n"
+        template.park = put_value(G = 1, X = park_x, Y = park_y, F = 9000) + "\n"
+        template.clearance_line = put_value(G = 1, Z = 15, F = 9000) + " ; too close to bed--move to at least 15mm\n"
+        template.clearance_below = 15
+
+        if control_temperatures:
+            # Set extruder standby temperature
+            template.standby_line = put_value(M = 104, S = standby_temperature) + " ; standby temperature\n"
+
+    tail = ""
+    if display_text:
+        tail += "M117 " + display_text + "\n"
+
+    # Set the disarm timeout
+    if disarm_timeout > 0:
+        tail += put_value(M = 18, S = disarm_timeout) + " ; Set the disarm timeout\n"
+
+    # Set a custom GCODE section before pause
+    if gcode_before:
+        tail += gcode_before + "\n"
+
+    tmp_unload_amount = unload_amount
+    if tmp_unload_amount is not None:
+        while tmp_unload_amount > 0:
+            if tmp_unload_amount - 200 <= 0:
+                tail += put_value(G = 1, E = -tmp_unload_amount, F = retraction_speed * 60) + "\n"
+            else:
+                tail += put_value(G = 1, E = -200, F = retraction_speed * 60) + "\n"
+            tmp_unload_amount -= 200
+
+    template.tail += tail
+
+    # Wait till the user continues printing
+    template.pause = pause_command + " ; Do the actual pause\n"
+
+    # Heat up again while the filament is swapped, instead of after the pause
+    if settings.get("reheat_during_pause") and control_temperatures and pause_method not in ["griffin", "repetier"]:
+        template.reheat_line = put_value(M = 104, S = TEMPERATURE_VALUE) + " ; reheat to the print temperature during the pause\n"
+        template.reheat_wait_line = put_value(M = 109, S = TEMPERATURE_VALUE) + " ; wait for the print temperature before loading\n"
+
+    tail = ""
+    tmp_load_amount = load_amount
+    if tmp_load_amount is not None:
+        while tmp_load_amount > 0:
+            if tmp_load_amount - 100 <= 0:
+                tail += put_value(G = 1, E = tmp_load_amount, F = retraction_speed * 60) + "\n"
+            else:
+                tail += put_value(G = 1, E = 100, F = retraction_speed * 60) + "\n"
+            tmp_load_amount -= 100
+
+    # Wait till the user continues printing
+    tail += pause_command + " ; Do the another pause\n"
+
+    # Set a custom GCODE section after pause
+    if gcode_after:
+        tail += gcode_after + "\n"
+
+    template.load = tail
+
+    # Travel back to where the print resumes, so the next move doesn't start at the park position
+    if settings.get("return_to_print") and template.lift_line is not None:
+        template.resume_line = put_value(G = 0, X = X_VALUE, Y = Y_VALUE, F = 9000) + " ; travel back to where the print resumes\n"
+        template.resume_line += put_value(G = 0, Z = Z_VALUE, F = 300) + "\n"
+
+    template.end = put_value(M = 82) + "\n"
+    return template
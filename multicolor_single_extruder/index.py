@@ -0,0 +1,53 @@
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence
+import re
+
+##  A tool change line (e.g. "T1") including its line break.
+TOOL_CHANGE_LINE = re.compile(r"^T([0-9]+)[^\n]*\n?", re.MULTILINE)
+
+class ToolChange(NamedTuple):
+    """A tool change line in the G-code."""
+    layer: int      # index of the layer in the data list
+    start: int      # offset of the line in the layer
+    end: int        # offset after the line break of the line
+    tool: int
+
+def scan_layer(layer_number: int, layer: str) -> List[ToolChange]:
+    """Finds the tool changes of a single layer."""
+    return [ToolChange(layer_number, match.start(), match.end(), int(match.group(1))) for match in TOOL_CHANGE_LINE.finditer(layer)]
+
+class ToolChangeIndex:
+    """The tool changes of all layers, in order of appearance.
+
+    The index is built with one regex pass over each layer, so passes and
+    reports that need the tool changes do not have to scan the G-code again.
+    The functions that take an optional `index` of their layers use it
+    instead of scanning the layers, if one is given.
+    """
+
+    def __init__(self, data: Sequence[str] = ()) -> None:
+        self._changes: List[ToolChange] = []
+        self._by_layer: Dict[int, List[ToolChange]] = {}
+        for layer_number, layer in enumerate(data):
+            changes = scan_layer(layer_number, layer)
+            if changes:
+                self._changes.extend(changes)
+                self._by_layer[layer_number] = changes
+
+    def __len__(self) -> int:
+        return len(self._changes)
+
+    def __iter__(self) -> Iterator[ToolChange]:
+        return iter(self._changes)
+
+    @property
+    def first(self) -> Optional[ToolChange]:
+        """The tool change that selects the initial extruder."""
+        return self._changes[0] if self._changes else None
+
+    def layers(self) -> List[int]:
+        """The numbers of the layers that contain tool changes."""
+        return list(self._by_layer)
+
+    def in_layer(self, layer_number: int) -> List[ToolChange]:
+        """The tool changes of a layer."""
+        return self._by_layer.get(layer_number, [])
@@ -0,0 +1,61 @@
+from queue import Empty, Full, Queue
+from typing import Iterable, Iterator, TypeVar
+import threading
+
+T = TypeVar("T")
+
+##  How many items the background thread may run ahead of the consumer.
+PREFETCH_DEPTH = 8
+
+##  How often (in seconds) a blocked thread checks whether the consumer has stopped.
+POLL_INTERVAL = 0.1
+
+_DONE = object()
+
+def prefetch(items: Iterable[T], depth: int = PREFETCH_DEPTH) -> Iterator[T]:
+    """Produces the items in a background thread while the consumer handles earlier ones.
+
+    This lets the consumer write or upload a rewritten layer while the next one
+    is being rewritten. Exceptions of the producer are raised in the consumer.
+    If the consumer stops early, the thread stops as well.
+    """
+    queue: Queue = Queue(maxsize = depth)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                queue.put(item, timeout = POLL_INTERVAL)
+                return True
+            except Full:
+                pass
+        return False
+
+    def produce() -> None:
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((_DONE, e))
+            return
+        put((_DONE, None))
+
+    thread = threading.Thread(target = produce, name = "prefetch", daemon = True)
+    thread.start()
+    try:
+        while True:
+            item, error = queue.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        stopped.set()
+        try:
+            while True:
+                queue.get_nowait()
+        except Empty:
+            pass
+        thread.join()
@@ -0,0 +1,142 @@
+from contextlib import contextmanager, nullcontext
+from typing import Any, ContextManager, Dict, Iterable, Iterator, Optional, TypeVar
+import cProfile
+import json
+import threading
+import time
+import tracemalloc
+
+from .index import TOOL_CHANGE_LINE, ToolChangeIndex
+
+T = TypeVar("T")
+
+class Profiler:
+    """Measures where the time of a run goes, if enabled.
+
+    The time of every phase is the time spent in it minus the time spent in
+    phases nested in it, so the phases add up to the total even if one phase
+    pulls its layers from another. Phases may run in different threads. The
+    peak memory use is traced with tracemalloc, and with `cprofile` set, the
+    calls of the calling thread are profiled with cProfile as well.
+
+    A disabled profiler does nothing: its phases are no-op context managers
+    and its wrappers return the layers as they are, so it can be used on the
+    hot path unconditionally.
+    """
+
+    def __init__(self, enabled: bool = True, cprofile: bool = False) -> None:
+        self.enabled = enabled or cprofile
+        self.phases: Dict[str, float] = {}  # the seconds spent in each phase
+        self.lines = 0                      # the lines of G-code counted
+        self.bytes = 0                      # their characters, which are bytes for ASCII G-code
+        self.tool_changes = 0               # the tool changes in the counted layers
+        self.removed_tool_changes = 0       # the redundant ones among them, which are removed instead of replaced
+        self.peak_memory: Optional[int] = None  # the peak of the memory allocated by Python (in bytes)
+        self.seconds = 0.0
+        self.cprofile = cProfile.Profile() if cprofile else None
+        self._start = 0.0
+        self._traced = False
+        self._lock = threading.Lock()
+        self._nested = threading.local()
+
+    def start(self) -> None:
+        if not self.enabled:
+            return
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start()
+            self._traced = True
+        if self.cprofile is not None:
+            self.cprofile.enable()
+        self._start = time.perf_counter()
+
+    def stop(self) -> None:
+        if not self.enabled:
+            return
+        self.seconds = time.perf_counter() - self._start
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        self.peak_memory = tracemalloc.get_traced_memory()[1]
+        if self._traced:
+            tracemalloc.stop()
+            self._traced = False
+
+    def phase(self, name: str) -> ContextManager[None]:
+        """A context manager that adds the time spent in it to a phase."""
+        return self._phase(name) if self.enabled else nullcontext()
+
+    @contextmanager
+    def _phase(self, name: str) -> Iterator[None]:
+        outer = getattr(self._nested, "seconds", 0.0)
+        self._nested.seconds = 0.0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + seconds - self._nested.seconds
+            self._nested.seconds = outer + seconds
+
+    def timed(self, name: str, items: Iterable[T]) -> Iterable[T]:
+        """The items, with the time spent producing them added to a phase."""
+        return self._timed(name, items) if self.enabled else items
+
+    def _timed(self, name: str, items: Iterable[T]) -> Iterator[T]:
+        iterator = iter(items)
+        while True:
+            with self._phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, layers: Iterable[str]) -> Iterable[str]:
+        """The layers, with their lines, bytes and tool changes added to the counts as they pass."""
+        return self._count(layers) if self.enabled else layers
+
+    def _count(self, layers: Iterable[str]) -> Iterator[str]:
+        for layer in layers:
+            self.add_layer(layer)
+            yield layer
+
+    def add_layer(self, layer: str) -> None:
+        self.lines += layer.count("\n")
+        self.bytes += len(layer)
+        self.tool_changes += len(TOOL_CHANGE_LINE.findall(layer))
+
+    def add_layers(self, layers: Iterable[str], index: Optional[ToolChangeIndex] = None) -> None:
+        """Adds the lines, bytes and tool changes of layers to the counts."""
+        if not self.enabled:
+            return
+        if index is None:
+            for layer in layers:
+                self.add_layer(layer)
+            return
+        for layer in layers:
+            self.lines += layer.count("\n")
+            self.bytes += len(layer)
+        self.tool_changes += len(index)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "seconds": round(self.seconds, 6),
+            "phases": {name: round(seconds, 6) for name, seconds in self.phases.items()},
+            "lines": self.lines,
+            "bytes": self.bytes,
+            "lines_per_second": round(self.lines / self.seconds) if self.seconds > 0 else None,
+            "tool_changes": self.tool_changes,
+            "tool_changes_replaced": max(self.tool_changes - 1 - self.removed_tool_changes, 0),   # the first one selects the initial extruder
+            "removed_tool_changes": self.removed_tool_changes,
+            "peak_memory": self.peak_memory,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    def dump_stats(self, path: str) -> None:
+        """Writes the cProfile statistics, which can be read with pstats or tools like snakeviz."""
+        if self.cprofile is not None:
+            self.cprofile.dump_stats(path)
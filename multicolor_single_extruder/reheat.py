@@ -0,0 +1,67 @@
+from typing import AbstractSet, Iterable, List, Optional, Tuple, Union
+import re
+
+from .index import ToolChangeIndex, scan_layer
+from .zindex import word_value
+
+##  The code of a line that sets the nozzle temperature.
+TEMPERATURE_CODE = re.compile(r"M10[49](?![0-9])[^;\n]*")
+
+##  How fast (in degrees per second) a typical hotend heats up, to estimate the time a reheat takes.
+HEATING_RATE = 2.0
+
+##  How long (in seconds) the user typically takes to swap the filament during the pause.
+SWAP_SECONDS = 60.0
+
+def last_temperature(layer: str, end: Optional[int] = None) -> Optional[Union[int, float]]:
+    """The last nozzle temperature set in a layer before the `end` offset, None if no line sets it.
+
+    Lines with a T parameter are ignored: they set the temperature of another
+    (virtual) extruder, which is the same nozzle for a single extruder.
+    """
+    if end is None:
+        end = len(layer)
+    while True:
+        position = layer.rfind("M10", 0, end)
+        if position < 0:
+            return None
+        end = position
+        if position > 0 and layer[position - 1] != "\n":
+            continue
+        match = TEMPERATURE_CODE.match(layer, position)
+        if match is None or word_value(match.group(0), "T") is not None:
+            continue
+        temperature = word_value(match.group(0), "S")
+        if temperature is not None:
+            return temperature
+
+def tool_change_temperatures(layers: Iterable[str], removed: AbstractSet[Tuple[int, int]] = frozenset(), index: Optional[ToolChangeIndex] = None) -> List[Union[int, float]]:
+    """The nozzle temperature before each tool change that gets a pause, where it is known."""
+    temperatures = []
+    temperature = None
+    tool_changed = False
+    for layer_number, layer in enumerate(layers):
+        for change in scan_layer(layer_number, layer) if index is None else index.in_layer(layer_number):
+            if not tool_changed:
+                tool_changed = True
+                continue
+            if (layer_number, change.start) in removed:
+                continue
+            current = last_temperature(layer, change.start)
+            if current is None:
+                current = temperature
+            if current is not None:
+                temperatures.append(current)
+
+        layer_temperature = last_temperature(layer)
+        if layer_temperature is not None:
+            temperature = layer_temperature
+    return temperatures
+
+def reheat_seconds_saved(temperatures: Iterable[Union[int, float]], standby_temperature: Union[int, float]) -> float:
+    """The estimated waiting time saved by reheating during the pauses at these temperatures.
+
+    Without reheating, the nozzle heats up from the standby temperature after
+    the user has swapped the filament. With it, heating overlaps the swap.
+    """
+    return sum(min(max(temperature - standby_temperature, 0) / HEATING_RATE, SWAP_SECONDS) for temperature in temperatures)
@@ -0,0 +1,199 @@
+from typing import Iterable, Iterator, List, Optional, Tuple
+import re
+
+from .elimination import EXTRUDING_MOVE
+from .gcode import put_value
+from .index import ToolChange, scan_layer
+from .zindex import NUMBER, last_value, word_value
+
+##  A reset of the extruder position, which Cura emits after every tool change.
+EXTRUDER_RESET = re.compile(r"^G92[^;\n]*[ \t]E", re.MULTILINE)
+
+##  The comment Cura ends the moves of every layer with. When a file is streamed, the end G-code follows it in the last layer.
+TIME_ELAPSED_LINE = re.compile(r"^;TIME_ELAPSED:", re.MULTILINE)
+
+##  Differences in E (in mm) below this are rounding errors.
+E_TOLERANCE = 1e-4
+
+##  The X and Y words of an extruding move.
+X_WORD = re.compile(r"[ \t]X(" + NUMBER.pattern + ")")
+Y_WORD = re.compile(r"[ \t]Y(" + NUMBER.pattern + ")")
+
+def content_end(layer: str, start: int = 0) -> int:
+    """The offset where the moves of a layer end, searching from `start`.
+
+    This is the first ;TIME_ELAPSED comment after `start`, so G-code after it,
+    like the end G-code, is not part of the last segment. Without one, it is
+    the offset after the last line that is not a comment.
+    """
+    match = TIME_ELAPSED_LINE.search(layer, start)
+    if match is not None:
+        return match.start()
+    end = len(layer)
+    while end > start:
+        line_start = layer.rfind("\n", 0, end - 1) + 1
+        if not layer.startswith(";", line_start):
+            break
+        end = line_start
+    return end
+
+def extrusion_bounds(layer: str, start: int, end: int) -> Optional[Tuple[float, float, float, float]]:
+    """The (min x, min y, max x, max y) of the extruding moves between two offsets, None if nothing is extruded."""
+    xs = []
+    ys = []
+    for match in EXTRUDING_MOVE.finditer(layer, start, end):
+        line_end = layer.find("\n", match.start(), end)
+        line = layer[match.start():end if line_end < 0 else line_end].split(";", 1)[0]
+        x = X_WORD.search(line)
+        y = Y_WORD.search(line)
+        if x is not None:
+            xs.append(float(x.group(1)))
+        if y is not None:
+            ys.append(float(y.group(1)))
+    if not xs or not ys:
+        return None
+    return min(xs), min(ys), max(xs), max(ys)
+
+def retraction(layer: str, start: int, end: int) -> Optional[Tuple[float, Optional[float]]]:
+    """How far the filament is retracted at the `end` offset, and the feedrate it was retracted with.
+
+    This is the E of the last extruding move between the offsets minus the
+    last E before `end`, so 0 if the filament was not retracted (or primed
+    again) after the last extruding move. None if nothing is extruded.
+    """
+    last_move = None
+    for last_move in EXTRUDING_MOVE.finditer(layer, start, end):
+        pass
+    if last_move is None:
+        return None
+
+    line_end = layer.find("\n", last_move.start(), end)
+    line_end = end if line_end < 0 else line_end
+    extruded = word_value(layer[last_move.start():line_end].split(";", 1)[0], "E")
+    e = last_value(layer, "E", start, end)
+    if extruded is None or e is None:
+        return None
+    return extruded - e, last_value(layer, "F", line_end, end)
+
+def overlap(a: Optional[Tuple[float, float, float, float]], b: Optional[Tuple[float, float, float, float]]) -> bool:
+    if a is None or b is None:
+        return False
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+class SegmentReorderer:
+    """Reorders the tool segments of layers so that fewer filament swaps are needed.
+
+    A segment is the part of a layer from a tool change up to the next one.
+    When a layer starts by switching away from the tool the previous layer
+    ended with, the segment of that tool is moved to the front of the layer
+    and its now pointless tool change is removed. With virtual extruders this
+    turns A->B | B->A into A->B | A, saving a swap on every such layer. When a
+    layer starts with a tool change to the tool that is already active, which
+    happens on the layer after a reordered one, that tool change is removed.
+
+    A segment is only moved if
+    - the layer prints nothing before its first tool change,
+    - every segment of the layer resets the extruder position (G92 E),
+    - the segments it is moved in front of don't change Z, and
+    - it doesn't overlap the segments it is moved in front of (in X/Y).
+    If the last segment of a layer moves, the extruder position and the
+    retraction it ended with are restored at the end of the layer.
+
+    The layers have to be passed in order, as the tool at the end of each layer
+    decides how the next one is reordered.
+    """
+
+    def __init__(self) -> None:
+        self.tool: Optional[int] = None     # the active tool at the end of the last layer
+        self.saved = 0                      # the number of tool changes that were removed, each a filament swap saved
+
+    def reorder(self, layer_number: int, layer: str) -> str:
+        """The layer with its segments reordered, or the layer itself if nothing was moved."""
+        changes = scan_layer(layer_number, layer)
+        if not changes:
+            return layer
+
+        incoming = self.tool
+        self.tool = changes[-1].tool
+        if incoming is None:
+            return layer
+        if changes[0].tool == incoming:
+            self.saved += 1
+            return layer[:changes[0].start] + layer[changes[0].end:]
+
+        end = content_end(layer, changes[-1].end)
+        starts = [change.start for change in changes]
+        ends = starts[1:] + [end]
+        moved = self._find_movable_segment(layer, changes, incoming, starts, ends)
+        if moved is None:
+            return layer
+
+        head_end = starts[0]
+
+        parts = [layer[:head_end], layer[changes[moved].end:ends[moved]], layer[head_end:starts[moved]], layer[ends[moved]:end]]
+        if moved == len(changes) - 1:
+            self.tool = changes[moved - 1].tool
+            parts.append(self._restore_extruder(layer, changes[moved - 1], changes[moved], end))
+        parts.append(layer[end:])
+
+        self.saved += 1
+        return "".join(parts)
+
+    def reorder_layers(self, layers: Iterable[str]) -> Iterator[str]:
+        """Reorders a stream of layers."""
+        for layer_number, layer in enumerate(layers):
+            yield self.reorder(layer_number, layer)
+
+    def _restore_extruder(self, layer: str, last: ToolChange, moved: ToolChange, end: int) -> str:
+        """The G-code that restores the extruder state the moved last segment ended with.
+
+        The segment that is now last ends with the retraction before the moved
+        tool change, in its own extruder coordinates. If the moved segment
+        ended retracted by a different length (usually not at all, unless Cura
+        retracts at the layer change), the filament is primed or retracted by
+        the difference. Then the extruder position is set to the one the layer
+        ended with.
+        """
+        restore = ""
+        current = retraction(layer, last.end, moved.start)
+        target = retraction(layer, moved.end, end)
+        e = last_value(layer, "E", last.end, moved.start)
+        if current is not None and target is not None and e is not None and abs(current[0] - target[0]) > E_TOLERANCE:
+            # Prime with the feedrate of the retraction that is undone, retract like the moved segment did
+            if current[0] > target[0]:
+                feedrate, comment = current[1], " ; prime after reordering\n"
+            else:
+                feedrate, comment = target[1], " ; retract after reordering\n"
+            e = round(e + current[0] - target[0], 5)
+            if e == int(e):
+                e = int(e)
+            restore += (put_value(G = 1, E = e) if feedrate is None else put_value(G = 1, F = feedrate, E = e)) + comment
+
+        e = last_value(layer, "E", moved.end, end)
+        if e is not None:
+            restore += put_value(G = 92, E = e) + " ; restore the extruder position after reordering\n"
+        return restore
+
+    def _find_movable_segment(self, layer: str, changes: List[ToolChange], incoming: int, starts: List[int], ends: List[int]) -> Optional[int]:
+        moved = next((i for i, change in enumerate(changes) if change.tool == incoming), None)
+        if moved is None:
+            return None
+
+        if EXTRUDING_MOVE.search(layer, 0, starts[0]) is not None:
+            return None
+        if any(EXTRUDER_RESET.search(layer, start, segment_end) is None for start, segment_end in zip(starts, ends)):
+            return None
+        if last_value(layer, "Z", 0, starts[0]) != last_value(layer, "Z", 0, starts[moved]):
+            return None
+
+        bounds = extrusion_bounds(layer, starts[moved], ends[moved])
+        if any(overlap(bounds, extrusion_bounds(layer, starts[i], ends[i])) for i in range(moved)):
+            return None
+        return moved
+
+def reorder_segments(data: List[str]) -> int:
+    """Reorders the tool segments of all layers in place, returning the number of tool changes saved."""
+    reorderer = SegmentReorderer()
+    for layer_number, layer in enumerate(data):
+        data[layer_number] = reorderer.reorder(layer_number, layer)
+    return reorderer.saved
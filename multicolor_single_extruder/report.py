@@ -0,0 +1,232 @@
+##  Per-color filament usage and timing report, computed with NumPy.
+##
+##  NumPy is bundled with Cura; outside of Cura it has to be installed to use this module.
+
+from typing import AbstractSet, Any, Dict, Iterable, List, Tuple
+import json
+
+import numpy
+
+from .index import scan_layer
+
+##  The layers are analyzed in chunks of about this many characters, to bound the memory use.
+CHUNK_SIZE = 16 * 1024 * 1024
+
+##  Numbers are read from at most this many characters.
+MAX_NUMBER_LENGTH = 16
+
+_NEWLINE, _SPACE, _TAB, _COMMENT, _MINUS, _DOT, _ZERO = b"\n \t;-.0"
+_LAYER_MARKER = numpy.frombuffer(b";LAYER:", numpy.uint8)
+
+def _parse_numbers(buffer: numpy.ndarray, positions: numpy.ndarray) -> numpy.ndarray:
+    """The numbers that start at the positions of a (padded) buffer, NaN where there is no number.
+
+    A number is an optional minus sign followed by digits with at most one
+    decimal point, like Cura writes them.
+    """
+    negative = buffer[positions] == _MINUS
+    window = buffer[(positions + negative)[:, None] + numpy.arange(MAX_NUMBER_LENGTH)]
+    digits = window - numpy.uint8(_ZERO)    # characters that are not digits wrap around to more than 9
+    is_digit = digits <= 9
+    is_dot = window == _DOT
+    is_dot &= numpy.cumsum(is_dot, axis = 1, dtype = numpy.int8) == 1
+    in_number = numpy.logical_and.accumulate(is_digit | is_dot, axis = 1)
+    is_digit &= in_number
+    in_fraction = numpy.logical_or.accumulate(is_dot & in_number, axis = 1) & is_digit
+
+    # Build the digits as an integer and divide it by the power of ten of the fraction, like float() rounds
+    mantissa = numpy.zeros(len(positions), numpy.int64)
+    for column in range(MAX_NUMBER_LENGTH):
+        mantissa = numpy.where(is_digit[:, column], mantissa * 10 + digits[:, column], mantissa)
+    values = mantissa / 10.0 ** numpy.count_nonzero(in_fraction, axis = 1)
+    values[negative] *= -1
+    values[~is_digit.any(axis = 1)] = numpy.nan
+    return values
+
+def _fill(values: numpy.ndarray, initial: float) -> numpy.ndarray:
+    """Replaces the NaNs by the last value before them (or `initial`)."""
+    values = numpy.concatenate(([initial], values))
+    indices = numpy.where(numpy.isnan(values), 0, numpy.arange(len(values)))
+    numpy.maximum.accumulate(indices, out = indices)
+    return values[indices][1:]
+
+def _steps(values: numpy.ndarray, initial: float) -> numpy.ndarray:
+    return numpy.diff(values, prepend = initial)
+
+class ColorReport:
+    """Extruded length, travel distance and print time per tool, and the time until each filament change.
+
+    The G-code is converted to a byte array and all lines are parsed at once
+    with NumPy, so the numbers are computed without any Python code per line.
+    The print time is estimated from the move lengths and feedrates, without
+    acceleration, so it is a lower bound.
+    """
+
+    def __init__(self) -> None:
+        self.extruded: Dict[int, float] = {}    # mm of filament per tool
+        self.travel: Dict[int, float] = {}      # mm of travel moves per tool
+        self.seconds: Dict[int, float] = {}     # print time per tool
+        self.changes: List[Dict[str, Any]] = [] # the filament changes: tool, layer and time before the change
+        self.total_seconds = 0.0
+        # The state at the end of the G-code analyzed so far
+        self._state = {"x": 0.0, "y": 0.0, "z": 0.0, "e": 0.0, "f": 0.0, "tool": 0.0, "relative": 0.0, "layer": numpy.nan}
+        self._tool_changed = False
+
+    def analyze(self, layers: Iterable[str], removed: AbstractSet[Tuple[int, int]] = frozenset()) -> "ColorReport":
+        """Adds the layers to the report. The tool changes at the (layer number, offset) positions in `removed` are ignored."""
+        removed_layers = {layer_number for layer_number, _ in removed}
+        chunk: List[str] = []
+        size = 0
+        for layer_number, layer in enumerate(layers):
+            if layer_number in removed_layers:
+                layer = self._ignore_removed(layer_number, layer, removed)
+            chunk.append(layer)
+            size += len(layer)
+            if size >= CHUNK_SIZE:
+                self._add_gcode("".join(chunk))
+                chunk = []
+                size = 0
+        if chunk:
+            self._add_gcode("".join(chunk))
+        return self
+
+    def _ignore_removed(self, layer_number: int, layer: str, removed: AbstractSet[Tuple[int, int]]) -> str:
+        # Turn the removed tool changes into comments
+        parts = []
+        start = 0
+        for change in scan_layer(layer_number, layer):
+            if (layer_number, change.start) in removed:
+                parts.append(layer[start:change.start] + ";")
+                start = change.start
+        parts.append(layer[start:])
+        return "".join(parts)
+
+    def _add_gcode(self, gcode: str) -> None:
+        text = gcode.encode("utf-8", "surrogateescape")
+        buffer = numpy.frombuffer(text + b"\0" * (MAX_NUMBER_LENGTH + len(_LAYER_MARKER)), numpy.uint8)
+        newlines = numpy.flatnonzero(buffer[:len(text)] == _NEWLINE)
+        starts = numpy.concatenate(([0], newlines + 1))
+        ends = numpy.append(newlines, len(text))
+        first, second, third = buffer[starts], buffer[starts + 1], buffer[starts + 2]
+        second_is_digit = (second >= _ZERO) & (second <= _ZERO + 9)
+        third_is_digit = (third >= _ZERO) & (third <= _ZERO + 9)
+
+        is_move = (first == ord("G")) & ((second == _ZERO) | (second == _ZERO + 1)) & ~third_is_digit
+        is_set = (first == ord("G")) & (second == _ZERO + 9) & (third == _ZERO + 2) & ~((buffer[starts + 3] >= _ZERO) & (buffer[starts + 3] <= _ZERO + 9))
+        is_tool_change = (first == ord("T")) & second_is_digit
+        is_mode = (first == ord("M")) & (second == _ZERO + 8) & ((third == _ZERO + 2) | (third == _ZERO + 3)) & ~((buffer[starts + 3] >= _ZERO) & (buffer[starts + 3] <= _ZERO + 9))
+        is_layer = (buffer[starts[:, None] + numpy.arange(len(_LAYER_MARKER))] == _LAYER_MARKER).all(axis = 1)
+
+        # Only the lines the report needs are kept
+        rows = numpy.flatnonzero(is_move | is_set | is_tool_change | is_mode | is_layer)
+        row_count = len(rows)
+        if row_count == 0:
+            return
+        is_move, is_set, is_tool_change, is_mode, is_layer = is_move[rows], is_set[rows], is_tool_change[rows], is_mode[rows], is_layer[rows]
+        is_travel = is_move & (second[rows] == _ZERO)
+        row_starts = starts[rows]
+
+        # The words of the moves, up to the comment of their line
+        comments = numpy.flatnonzero(buffer[:len(text)] == _COMMENT)
+        comment_index = numpy.searchsorted(comments, row_starts)
+        code_ends = numpy.minimum(ends[rows], numpy.append(comments, len(text))[comment_index])
+        word_values = {}
+        for word in "FXYZE":
+            positions = numpy.flatnonzero(buffer[1:len(text)] == ord(word)) + 1
+            positions = positions[(buffer[positions - 1] == _SPACE) | (buffer[positions - 1] == _TAB)]
+            row = numpy.searchsorted(row_starts, positions, side = "right") - 1
+            keep = (row >= 0)
+            row, positions = row[keep], positions[keep]
+            keep = (is_move | is_set)[row] & (positions < code_ends[row])
+            row, positions = row[keep], positions[keep]
+            # Like getValue, the first occurrence of a word in a line counts
+            row, first_occurrence = numpy.unique(row, return_index = True)
+            values = numpy.full(row_count, numpy.nan)
+            values[row] = _parse_numbers(buffer, positions[first_occurrence] + 1)
+            word_values[word] = values
+
+        layer = numpy.full(row_count, numpy.nan)
+        layer[is_layer] = _parse_numbers(buffer, row_starts[is_layer] + len(_LAYER_MARKER))
+        tool = numpy.full(row_count, numpy.nan)
+        tool[is_tool_change] = _parse_numbers(buffer, row_starts[is_tool_change] + 1)
+        self._add_rows(
+            layer = layer, tool = tool,
+            mode = numpy.where(is_mode, buffer[row_starts + 2] == _ZERO + 3, numpy.nan),
+            is_move = is_move, is_set = is_set, is_travel = is_travel, **word_values)
+
+    def _add_rows(self, layer, tool, mode, is_move, is_set, is_travel, F, X, Y, Z, E) -> None:
+        state = self._state
+        is_tool_change = ~numpy.isnan(tool)
+        layer = _fill(layer, state["layer"])
+        tool = _fill(tool, state["tool"])
+        relative = _fill(mode, state["relative"]).astype(bool)
+
+        x = _fill(numpy.where(is_move, X, numpy.nan), state["x"])
+        y = _fill(numpy.where(is_move, Y, numpy.nan), state["y"])
+        z = _fill(numpy.where(is_move, Z, numpy.nan), state["z"])
+        f = _fill(numpy.where(is_move, F, numpy.nan), state["f"])
+        # The absolute extruder position is set by absolute moves and G92
+        e = _fill(numpy.where(is_set | is_move & ~relative, E, numpy.nan), state["e"])
+        de = numpy.where(relative, numpy.nan_to_num(E), _steps(e, state["e"]))
+        de[~is_move] = 0
+
+        dx, dy, dz = _steps(x, state["x"]), _steps(y, state["y"]), _steps(z, state["z"])
+        length = numpy.sqrt(dx * dx + dy * dy + dz * dz)
+        length = numpy.where(length > 0, length, numpy.abs(de))
+        with numpy.errstate(divide = "ignore", invalid = "ignore"):
+            seconds = numpy.where(is_move & (f > 0), length / (f / 60), 0)
+        elapsed = self.total_seconds + numpy.cumsum(seconds)
+        travel = numpy.where(is_travel, numpy.hypot(dx, dy), 0)
+
+        tools = tool.astype(int)
+        for tool_number in numpy.unique(tools):
+            selected = tools == tool_number
+            tool_number = int(tool_number)
+            self.extruded[tool_number] = self.extruded.get(tool_number, 0.0) + float(de[selected].sum())
+            self.travel[tool_number] = self.travel.get(tool_number, 0.0) + float(travel[selected].sum())
+            self.seconds[tool_number] = self.seconds.get(tool_number, 0.0) + float(seconds[selected].sum())
+
+        for row in numpy.flatnonzero(is_tool_change):
+            if not self._tool_changed:
+                self._tool_changed = True   # the first tool change selects the initial extruder
+                continue
+            self.changes.append({
+                "tool": int(tool[row]),
+                "layer": None if numpy.isnan(layer[row]) else int(layer[row]),
+                "seconds": round(float(elapsed[row]), 1),
+            })
+
+        self.total_seconds = float(elapsed[-1])
+        state.update(x = x[-1], y = y[-1], z = z[-1], e = e[-1], f = f[-1], tool = tool[-1], relative = float(relative[-1]), layer = layer[-1])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total_seconds": round(self.total_seconds, 1),
+            "tools": {
+                str(tool): {
+                    "extruded_mm": round(self.extruded[tool], 2),
+                    "travel_mm": round(self.travel[tool], 2),
+                    "print_seconds": round(self.seconds[tool], 1),
+                } for tool in sorted(self.extruded)
+            },
+            "filament_changes": self.changes,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent = 2)
+
+    def to_comment(self) -> str:
+        """The report as a block of G-code comments."""
+        lines = [";MULTICOLOR REPORT", ";Estimated print time without filament changes: %s" % _format_duration(self.total_seconds)]
+        for tool in sorted(self.extruded):
+            lines.append(";T%d: %.1f mm filament, %.1f mm travel, %s" % (tool, self.extruded[tool], self.travel[tool], _format_duration(self.seconds[tool])))
+        for number, change in enumerate(self.changes, 1):
+            layer = "" if change["layer"] is None else " on layer %d" % change["layer"]
+            lines.append(";Filament change %d: T%d%s after %s" % (number, change["tool"], layer, _format_duration(change["seconds"])))
+        lines.append(";END OF MULTICOLOR REPORT")
+        return "\n".join(lines) + "\n"
+
+def _format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return "%d:%02d:%02d" % (hours, minutes, seconds)
@@ -0,0 +1,129 @@
+from typing import AbstractSet, Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from .halt import HaltTemplate
+from .index import ToolChange, ToolChangeIndex, scan_layer
+from .reheat import last_temperature
+from .zindex import LayerValueIndex, LayerZIndex, last_value, last_z, next_position
+
+class LayerState(NamedTuple):
+    """The state that is carried from one layer to the next."""
+    tool_changed: bool = False      # whether the tool change that selects the initial extruder has been seen
+    z: Union[int, float] = 0
+    temperature: Optional[Union[int, float]] = None    # the last nozzle temperature, if the halt block reheats
+
+def splice(layer: str, edits: Iterable[Tuple[int, int, str]]) -> str:
+    """Replaces the (start, end) spans of a layer by new text.
+
+    The edits have to be sorted and must not overlap. Only the slices between
+    the edits are copied; a layer without edits is returned as is.
+    """
+    parts = []
+    position = 0
+    for start, end, replacement in edits:
+        parts.append(layer[position:start])
+        parts.append(replacement)
+        position = end
+
+    if not parts:
+        return layer
+
+    parts.append(layer[position:])
+    return "".join(parts)
+
+def resume_position(layer: str, change: ToolChange) -> Optional[Tuple[Union[int, float], Union[int, float]]]:
+    """The X and Y where the print continues after a tool change, None if it is not known.
+
+    If the next move is a travel, that is where it goes. If the next move
+    extrudes, it has to start where the head was before the tool change.
+    """
+    move = next_position(layer, change.end)
+    if move is None:
+        return None
+    if not move.extrudes:
+        return move.x, move.y
+
+    x = last_value(layer, "X", 0, change.start)
+    y = last_value(layer, "Y", 0, change.start)
+    if x is None or y is None:
+        return None
+    return x, y
+
+def render_halt(template: HaltTemplate, layer: str, change: ToolChange, current_z: Union[int, float], temperature: Optional[Union[int, float]] = None) -> str:
+    """The halt block of a template for a tool change of a layer, at the given Z and print temperature."""
+    resume = None
+    if template.resume_line is not None:
+        resume = resume_position(layer, change)
+    return template.render(current_z, resume, temperature)
+
+def rewrite_tool_changes(data: List[str], render: Callable[[ToolChange], Optional[str]], index: Optional[ToolChangeIndex] = None, keep_first: bool = True) -> List[str]:
+    """Replaces the tool change lines of the G-code.
+
+    The first tool change selects the initial extruder and is kept, unless
+    `keep_first` is False because it came before `data`. `render` is called for
+    every other tool change, in order, and returns the replacement or None to
+    keep the line. Only the layers in the index are touched; it is built from
+    `data` if none is given.
+    """
+    if index is None:
+        index = ToolChangeIndex(data)
+
+    for layer_number in index.layers():
+        edits = []
+        for change in index.in_layer(layer_number):
+            if keep_first and change is index.first:
+                continue
+            replacement = render(change)
+            if replacement is not None:
+                edits.append((change.start, change.end, replacement))
+        data[layer_number] = splice(data[layer_number], edits)
+    return data
+
+def rewrite_halts(data: List[str], template: HaltTemplate, state: LayerState = LayerState(), removed: AbstractSet[Tuple[int, int]] = frozenset(), index: Optional[ToolChangeIndex] = None) -> List[str]:
+    """Replaces the tool changes by the halt block of a template.
+
+    `state` is the state before the first layer of `data`, which allows to
+    rewrite a range of layers on its own. The tool changes at the (layer
+    number, offset) positions in `removed` are removed instead.
+    """
+    z_index = LayerZIndex(data, state.z)
+    temperature_index = None
+    if template.reheat_line is not None:
+        temperature_index = LayerValueIndex(last_temperature, data, state.temperature)
+
+    def render(change: ToolChange) -> str:
+        if (change.layer, change.start) in removed:
+            return ""
+        temperature = None if temperature_index is None else temperature_index.value_at(change.layer, change.start)
+        return render_halt(template, data[change.layer], change, z_index.z_at(change.layer, change.start), temperature)
+
+    return rewrite_tool_changes(data, render, index, not state.tool_changed)
+
+def iter_rewrite_halts(layers: Iterable[str], template: HaltTemplate, state: LayerState = LayerState(), removed: AbstractSet[Tuple[int, int]] = frozenset(), index: Optional[ToolChangeIndex] = None) -> Iterator[str]:
+    """Like rewrite_halts, but yields each layer as soon as it is rewritten.
+
+    Only the current layer is kept in memory, so this works on streams of
+    layers of any length.
+    """
+    tool_changed, z, temperature = state
+    track_temperature = template.reheat_line is not None
+    for layer_number, layer in enumerate(layers):
+        edits = []
+        for change in scan_layer(layer_number, layer) if index is None else index.in_layer(layer_number):
+            if not tool_changed:
+                tool_changed = True
+                continue
+            if (layer_number, change.start) in removed:
+                edits.append((change.start, change.end, ""))
+                continue
+            current_z = last_z(layer, change.start)
+            current_temperature = last_temperature(layer, change.start) if track_temperature else None
+            edits.append((change.start, change.end, render_halt(template, layer, change, z if current_z is None else current_z, temperature if current_temperature is None else current_temperature)))
+        yield splice(layer, edits)
+
+        layer_z = last_z(layer)
+        if layer_z is not None:
+            z = layer_z
+        if track_temperature:
+            layer_temperature = last_temperature(layer)
+            if layer_temperature is not None:
+                temperature = layer_temperature
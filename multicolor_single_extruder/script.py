@@ -0,0 +1,145 @@
+from typing import Iterator, List, Set, Tuple
+
+from .elimination import redundant_tool_changes
+from .halt import HaltTemplate
+from .index import ToolChangeIndex
+from .pipeline import prefetch
+from .profiling import Profiler
+from .reheat import reheat_seconds_saved, tool_change_temperatures
+from .reorder import reorder_segments
+from .rewrite import iter_rewrite_halts, rewrite_halts
+from .strip import strip_regions
+
+class ToolChangeScript:
+    """The passes and the execute methods that both post-processing scripts share.
+
+    This is mixed into a Cura Script, which provides getSettingValueByKey and
+    getSettingDataString. The script provides buildTemplate, which builds its
+    halt block, and logInfo, which writes to the Cura log. The settings of both scripts define the settings the
+    passes read; the reheat pass only runs if the halt block reheats.
+    """
+
+    def buildTemplate(self) -> HaltTemplate:
+        raise NotImplementedError()
+
+    def logInfo(self, message: str) -> None:
+        raise NotImplementedError()
+
+    def stripRegions(self, data: List[str]) -> None:
+        """Removes the prime tower and ooze shield of the layers in place, if enabled."""
+        if not self.getSettingValueByKey("strip_prime_tower"):
+            return
+
+        stripper = strip_regions(data)
+        self.logInfo("Removed %d prime tower and ooze shield regions, saving %.1f mm of filament and %d seconds" % (stripper.regions, stripper.extruded, stripper.seconds))
+
+    def reorderSegments(self, data: List[str]) -> None:
+        """Reorders the extruder segments of the layers in place to save tool changes, if enabled."""
+        if not self.getSettingValueByKey("reorder_segments"):
+            return
+
+        saved = reorder_segments(data)
+        self.logInfo("Reordering extruder segments saved %d tool changes" % saved)
+
+    def findRedundantToolChanges(self, data: List[str], index: ToolChangeIndex) -> Set[Tuple[int, int]]:
+        """The (layer number, offset) of the tool changes that need no filament change, if enabled."""
+        if not self.getSettingValueByKey("remove_redundant_tool_changes"):
+            return set()
+
+        removed = redundant_tool_changes(data, index)
+        self.logInfo("Removed %d redundant tool changes" % len(removed))
+        return removed
+
+    def addColorReport(self, data: List[str], removed: Set[Tuple[int, int]]) -> None:
+        """Appends the filament usage report to the header of the g-code, if enabled."""
+        if not self.getSettingValueByKey("color_report"):
+            return
+
+        # NumPy is only needed for the report
+        from .report import ColorReport
+        report = ColorReport().analyze(data, removed)
+        self.logInfo("Filament usage report: %s" % report.to_dict())
+        data[0] += report.to_comment()
+
+    def logReheatSavings(self, data: List[str], removed: Set[Tuple[int, int]], template: HaltTemplate, index: ToolChangeIndex) -> None:
+        """Logs the estimated waiting time saved by reheating during the pauses, if the halt block reheats."""
+        if template.reheat_line is None:
+            return
+
+        temperatures = tool_change_temperatures(data, removed, index)
+        saved = reheat_seconds_saved(temperatures, self.getSettingValueByKey("standby_temperature"))
+        self.logInfo("Reheating during %d pauses saves about %d seconds" % (len(temperatures), saved))
+
+    def startProfiler(self) -> Profiler:
+        """Starts measuring where the time of the script goes, if enabled."""
+        profiler = Profiler(self.getSettingValueByKey("measure_performance"))
+        profiler.start()
+        return profiler
+
+    def logPerformance(self, profiler: Profiler) -> None:
+        profiler.stop()
+        if profiler.enabled:
+            self.logInfo("Performance: %s" % profiler.to_json())
+
+    def logPerformanceAfter(self, layers: Iterator[str], profiler: Profiler) -> Iterator[str]:
+        """The layers, logging the performance once all of them have been consumed."""
+        if not profiler.enabled:
+            return layers
+        return self._logPerformanceAfter(layers, profiler)
+
+    def _logPerformanceAfter(self, layers: Iterator[str], profiler: Profiler) -> Iterator[str]:
+        try:
+            yield from layers
+        finally:
+            self.logPerformance(profiler)
+
+    def runPasses(self, data: List[str], profiler: Profiler) -> Tuple[HaltTemplate, Set[Tuple[int, int]], ToolChangeIndex]:
+        """Runs the passes before the rewrite on the layers in place.
+
+        Returns the halt block, the tool changes to remove and the index of
+        the tool changes, which is built once the passes that move or remove
+        tool changes are done and shared by the passes after them.
+        """
+        with profiler.phase("strip"):
+            self.stripRegions(data)
+        with profiler.phase("reorder"):
+            self.reorderSegments(data)
+        with profiler.phase("scan"):
+            index = ToolChangeIndex(data)
+        with profiler.phase("redundant"):
+            removed = self.findRedundantToolChanges(data, index)
+        with profiler.phase("report"):
+            # The report is appended to the first layer, so the offsets of the index stay valid
+            self.addColorReport(data, removed)
+        with profiler.phase("template"):
+            template = self.buildTemplate()
+        with profiler.phase("reheat"):
+            self.logReheatSavings(data, removed, template, index)
+        profiler.add_layers(data, index)
+        profiler.removed_tool_changes = len(removed)
+        return template, removed, index
+
+    def execute(self, data: List[str]) -> List[str]:
+        """Replaces the tool changes by the halt block of the script.
+
+        The tool change that selects the initial extruder is kept; the other
+        tool change commands are removed since only one tool is available.
+        """
+        profiler = self.startProfiler()
+        template, removed, index = self.runPasses(data, profiler)
+        with profiler.phase("rewrite"):
+            data = rewrite_halts(data, template, removed = removed, index = index)
+        self.logPerformance(profiler)
+        return data
+
+    def execute_iter(self, data: List[str]) -> Iterator[str]:
+        """Like execute, but yields each layer as soon as it is rewritten.
+
+        The layers are rewritten in a background thread, so layer N can be
+        written while layer N+1 is rewritten. data is not modified.
+        """
+        profiler = self.startProfiler()
+        layers = list(data)
+        template, removed, index = self.runPasses(layers, profiler)
+        rewritten = iter_rewrite_halts(layers, template, removed = removed, index = index)
+        return self.logPerformanceAfter(prefetch(profiler.timed("rewrite", rewritten)), profiler)
@@ -0,0 +1,329 @@
+##  The setting definitions of the post-processing scripts, as returned by getSettingDataString.
+##  The command line interface builds its options from the same definitions.
+
+from typing import Any, Dict
+import json
+
+FILAMENT_CHANGE_SETTINGS = """{
+            "name":"Filament Change On Tool Change",
+            "key": "FilamentChangeOnToolChange",
+            "metadata": {},
+            "version": 2,
+            "settings":
+            {
+                "initial_retract":
+                {
+                    "label": "Initial Retraction",
+                    "description": "Initial filament retraction distance. The filament will be retracted with this amount before moving the nozzle away from the ongoing print.",
+                    "unit": "mm",
+                    "type": "float",
+                    "default_value": 30.0
+                },
+                "later_retract":
+                {
+                    "label": "Later Retraction Distance",
+                    "description": "Later filament retraction distance for removal. The filament will be retracted all the way out of the printer so that you can change the filament.",
+                    "unit": "mm",
+                    "type": "float",
+                    "default_value": 300.0
+                },
+                "x_position":
+                {
+                    "label": "X Position",
+                    "description": "Extruder X position. The print head will move here for filament change.",
+                    "unit": "mm",
+                    "type": "float",
+                    "default_value": 0
+                },
+                "y_position":
+                {
+                    "label": "Y Position",
+                    "description": "Extruder Y position. The print head will move here for filament change.",
+                    "unit": "mm",
+                    "type": "float",
+                    "default_value": 0
+                },
+                "strip_prime_tower":
+                {
+                    "label": "Remove Prime Tower And Ooze Shield",
+                    "description": "Remove the prime tower and the ooze shield (and a draft shield) that Cura generates for the virtual extruders. They are only useful for printers with several nozzles. The skirt or brim of the first layer is kept.",
+                    "type": "bool",
+                    "default_value": false
+                },
+                "color_report":
+                {
+                    "label": "Filament Usage Report",
+                    "description": "Add a comment block at the start of the G-code with the filament length, travel distance and print time per extruder and the estimated time until each filament change.",
+                    "type": "bool",
+                    "default_value": false
+                },
+                "reorder_segments":
+                {
+                    "label": "Reorder Extruder Segments",
+                    "description": "When a layer starts by switching away from the extruder the previous layer ended with, print the part of that extruder first if it doesn't overlap the parts printed before it. This saves a filament change on such layers.",
+                    "type": "bool",
+                    "default_value": false
+                },
+                "remove_redundant_tool_changes":
+                {
+                    "label": "Remove Redundant Tool Changes",
+                    "description": "Don't pause for tool changes that select the tool that is already active or that are followed by another tool change without extruding anything in between.",
+                    "type": "bool",
+                    "default_value": true
+                },
+                "measure_performance":
+                {
+                    "label": "Measure Performance",
+                    "description": "Measure how long each step of this script takes, how much G-code it processes and its peak memory use, and write the results to the log. This slows down post-processing.",
+                    "type": "bool",
+                    "default_value": false
+                }
+            }
+        }"""
+
+PAUSE_AT_HEIGHT_SETTINGS = """{
+            "name": "Pause At Height On Tool Change",
+            "key": "PauseAtHeightOnToolChange",
+            "metadata": {},
+            "version": 2,
+            "settings":
+            {
+                "pause_method":
+                {
+                    "label": "Method",
+                    "description": "The method or gcode command to use for pausing.",
+                    "type": "enum",
+                    "options": {"marlin": "Marlin (M0)", "griffin": "Griffin (M0, firmware retract)", "bq": "BQ (M25)", "reprap": "RepRap (M226)", "repetier": "Repetier (@pause)"},
+                    "default_value": "marlin",
+                    "value": "\\\"griffin\\\" if machine_gcode_flavor==\\\"Griffin\\\" else \\\"reprap\\\" if machine_gcode_flavor==\\\"RepRap (RepRap)\\\" else \\\"repetier\\\" if machine_gcode_flavor==\\\"Repetier\\\" else \\\"bq\\\" if \\\"BQ\\\" in machine_name or \\\"Flying Bear Ghost 4S\\\" in machine_name  else \\\"marlin\\\""
+                },                    
+                "disarm_timeout":
+                {
+                    "label": "Disarm timeout",
+                    "description": "After this time steppers are going to disarm (meaning that they can easily lose their positions). Set this to 0 if you don't want to set any duration.",
+                    "type": "int",
+                    "value": "0",
+                    "minimum_value": "0",
+                    "minimum_value_warning": "0",
+                    "maximum_value_warning": "1800",
+                    "unit": "s"
+                },
+                "head_park_x":
+                {
+                    "label": "Park Print Head X",
+                    "description": "What X location does the head move to when pausing.",
+                    "unit": "mm",
+                    "type": "float",
+                    "default_value": 190,
+                    "enabled": "pause_method != \\\"griffin\\\""
+                },
+                "head_park_y":
+                {
+                    "label": "Park Print Head Y",
+                    "description": "What Y location does the head move to when pausing.",
+                    "unit": "mm",
+                    "type": "float",
+                    "default_value": 190,
+                    "enabled": "pause_method != \\\"griffin\\\""
+                },
+                "head_move_z":
+                {
+                    "label": "Head move Z",
+                    "description": "The Height of Z-axis retraction before parking.",
+                    "unit": "mm",
+                    "type": "float",
+                    "default_value": 15.0,
+                    "enabled": "pause_method == \\\"repetier\\\""
+                },
+                "retraction_amount":
+                {
+                    "label": "Initial Retraction",
+                    "description": "How much filament must be retracted at pause.",
+                    "unit": "mm",
+                    "type": "float",
+                    "default_value": 0,
+                    "enabled": "pause_method != \\\"griffin\\\""
+                },
+                "unload_amount":
+                {
+                    "label": "Unload Amount",
+                    "description": "Once paused, amount of filament to be retracted (e.g. length of Bowden tube).",
+                    "unit": "mm",
+                    "type": "float",
+                    "default_value": 300,
+                    "enabled": "pause_method != \\\"griffin\\\""
+                },
+                "load_amount":
+                {
+                    "label": "Load Amount",
+                    "description": "Once filament has been loaded, amount of filament to be extruded (e.g. length of Bowden tube). Will pause before continuing.",
+                    "unit": "mm",
+                    "type": "float",
+                    "default_value": 300,
+                    "enabled": "pause_method != \\\"griffin\\\""
+                },
+                "retraction_speed":
+                {
+                    "label": "Retraction Speed",
+                    "description": "How fast to retract the filament.",
+                    "unit": "mm/s",
+                    "type": "float",
+                    "default_value": 25,
+                    "enabled": "pause_method not in [\\\"griffin\\\", \\\"repetier\\\"]"
+                },
+                "extrude_amount":
+                {
+                    "label": "Extrude Amount",
+                    "description": "How much filament should be extruded after pause. This is needed when doing a material change on Ultimaker2's to compensate for the retraction after the change. In that case 128+ is recommended.",
+                    "unit": "mm",
+                    "type": "float",
+                    "default_value": 0,
+                    "enabled": "pause_method != \\\"griffin\\\""
+                },
+                "extrude_speed":
+                {
+                    "label": "Extrude Speed",
+                    "description": "How fast to extrude the material after pause.",
+                    "unit": "mm/s",
+                    "type": "float",
+                    "default_value": 3.3333,
+                    "enabled": "pause_method not in [\\\"griffin\\\", \\\"repetier\\\"]"
+                },
+                "standby_temperature":
+                {
+                    "label": "Standby Temperature",
+                    "description": "Change the temperature during the pause.",
+                    "unit": "°C",
+                    "type": "int",
+                    "default_value": 0,
+                    "enabled": "pause_method not in [\\\"griffin\\\", \\\"repetier\\\"]"
+                },
+                "display_text":
+                {
+                    "label": "Display Text",
+                    "description": "Text that should appear on the display while paused. If left empty, there will not be any message.",
+                    "type": "str",
+                    "default_value": "",
+                    "enabled": "pause_method != \\\"repetier\\\""
+                },
+                "machine_name":
+                {
+                    "label": "Machine Type",
+                    "description": "The name of your 3D printer model. This setting is controlled by the script and will not be visible.",
+                    "default_value": "Unknown",
+                    "type": "str",
+                    "enabled": false
+                },
+                "machine_gcode_flavor":
+                {
+                    "label": "G-code flavor",
+                    "description": "The type of g-code to be generated. This setting is controlled by the script and will not be visible.",
+                    "type": "enum",
+                    "options":
+                    {
+                        "RepRap (Marlin/Sprinter)": "Marlin",
+                        "RepRap (Volumetric)": "Marlin (Volumetric)",
+                        "RepRap (RepRap)": "RepRap",
+                        "UltiGCode": "Ultimaker 2",
+                        "Griffin": "Griffin",
+                        "Makerbot": "Makerbot",
+                        "BFB": "Bits from Bytes",
+                        "MACH3": "Mach3",
+                        "Repetier": "Repetier"
+                    },
+                    "default_value": "RepRap (Marlin/Sprinter)",
+                    "enabled": false
+                },
+                "custom_gcode_before_pause":
+                {
+                    "label": "G-code Before Pause",
+                    "description": "Any custom g-code to run before the pause, for example, M300 S440 P200 to beep.",
+                    "type": "str",
+                    "default_value": ""
+                },
+                "custom_gcode_after_pause":
+                {
+                    "label": "G-code After Pause",
+                    "description": "Any custom g-code to run after the pause, for example, M300 S440 P200 to beep.",
+                    "type": "str",
+                    "default_value": ""
+                },
+                "return_to_print":
+                {
+                    "label": "Return To Print Position",
+                    "description": "After the pause, travel back to where the print continues at the height of the layer, instead of starting the next move at the park position.",
+                    "type": "bool",
+                    "default_value": true
+                },
+                "reheat_during_pause":
+                {
+                    "label": "Reheat During Pause",
+                    "description": "Heat the nozzle back to the print temperature before the filament is swapped and wait for it before loading, so heating overlaps the swap instead of following it. The print temperature is the last one the G-code set before the tool change. The nozzle is not cooled down to the standby temperature during these pauses.",
+                    "type": "bool",
+                    "default_value": false,
+                    "enabled": "pause_method not in [\\\"griffin\\\", \\\"repetier\\\"]"
+                },
+                "strip_prime_tower":
+                {
+                    "label": "Remove Prime Tower And Ooze Shield",
+                    "description": "Remove the prime tower and the ooze shield (and a draft shield) that Cura generates for the virtual extruders. They are only useful for printers with several nozzles. The skirt or brim of the first layer is kept.",
+                    "type": "bool",
+                    "default_value": false
+                },
+                "color_report":
+                {
+                    "label": "Filament Usage Report",
+                    "description": "Add a comment block at the start of the G-code with the filament length, travel distance and print time per extruder and the estimated time until each filament change.",
+                    "type": "bool",
+                    "default_value": false
+                },
+                "reorder_segments":
+                {
+                    "label": "Reorder Extruder Segments",
+                    "description": "When a layer starts by switching away from the extruder the previous layer ended with, print the part of that extruder first if it doesn't overlap the parts printed before it. This saves a filament change on such layers.",
+                    "type": "bool",
+                    "default_value": false
+                },
+                "remove_redundant_tool_changes":
+                {
+                    "label": "Remove Redundant Tool Changes",
+                    "description": "Don't pause for tool changes that select the tool that is already active or that are followed by another tool change without extruding anything in between.",
+                    "type": "bool",
+                    "default_value": true
+                },
+                "measure_performance":
+                {
+                    "label": "Measure Performance",
+                    "description": "Measure how long each step of this script takes, how much G-code it processes and its peak memory use, and write the results to the log. This slows down post-processing.",
+                    "type": "bool",
+                    "default_value": false
+                }
+            }
+        }"""
+
+def parse_setting(definition: Dict[str, Any], value: Any) -> Any:
+    """Converts a setting value to the type of its definition.
+
+    Booleans may also be given as "true" or "false", in any case; other
+    values of a boolean setting raise a ValueError.
+    """
+    setting_type = definition["type"]
+    if setting_type == "int":
+        return int(value)
+    if setting_type == "float":
+        return float(value)
+    if setting_type == "bool":
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.lower() in ("true", "false"):
+            return value.lower() == "true"
+        raise ValueError("%r is not a boolean" % (value,))
+    return str(value)
+
+def default_settings(setting_data: str) -> Dict[str, Any]:
+    """The default value of every setting of a setting data string."""
+    settings = {}
+    for key, definition in json.loads(setting_data)["settings"].items():
+        value = definition.get("default_value", definition.get("value"))
+        settings[key] = parse_setting(definition, value)
+    return settings
@@ -0,0 +1,111 @@
+from typing import AbstractSet, Iterable, Iterator, Optional, Tuple
+import mmap
+import os
+
+from .cache import LayerCache, rewrite_cached
+from .halt import HaltTemplate
+from .index import TOOL_CHANGE_LINE
+from .pipeline import prefetch
+from .profiling import Profiler
+from .reorder import SegmentReorderer
+from .rewrite import iter_rewrite_halts
+from .strip import RegionStripper
+
+##  G-code files are split into layers at these markers, like Cura splits its G-code.
+LAYER_MARKER = b"\n;LAYER:"
+
+##  Layers larger than this (in bytes) are split at a line break, to keep the memory use bounded.
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+
+##  G-code is read and written as UTF-8; bytes that are not valid UTF-8 are passed through as is.
+ENCODING = "utf-8"
+ENCODING_ERRORS = "surrogateescape"
+
+def iter_layers(path: str) -> Iterator[str]:
+    """Reads the layers of a G-code file one by one from a memory map of the file."""
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return  # empty files can't be mapped
+
+        with mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as gcode:
+            size = len(gcode)
+            start = 0
+            while start < size:
+                end = gcode.find(LAYER_MARKER, start, start + MAX_CHUNK_SIZE) + 1
+                if end <= 0:
+                    if start + MAX_CHUNK_SIZE >= size:
+                        end = size
+                    else:
+                        end = gcode.rfind(b"\n", start, start + MAX_CHUNK_SIZE) + 1
+                        if end <= 0:
+                            # Don't split a line, however long it is
+                            end = gcode.find(b"\n", start + MAX_CHUNK_SIZE) + 1 or size
+                yield gcode[start:end].decode(ENCODING, ENCODING_ERRORS)
+                start = end
+
+def read_layers(path: str, reorderer: Optional[SegmentReorderer] = None, stripper: Optional[RegionStripper] = None, profiler: Optional[Profiler] = None) -> Iterable[str]:
+    """The layers of a G-code file, stripped if a stripper is given and with their extruder segments reordered if a reorderer is given.
+
+    If a profiler is given, reading, stripping and reordering are timed as
+    its split, strip and reorder phases.
+    """
+    if profiler is None:
+        profiler = Profiler(enabled = False)
+    layers = profiler.timed("split", iter_layers(path))
+    if stripper is not None:
+        layers = profiler.timed("strip", stripper.strip_layers(layers))
+    return layers if reorderer is None else profiler.timed("reorder", reorderer.reorder_layers(layers))
+
+def rewrite_file(input_path: str, output_path: str, template: HaltTemplate, removed: AbstractSet[Tuple[int, int]] = frozenset(), reorderer: Optional[SegmentReorderer] = None, header: str = "", cache: Optional[LayerCache] = None, stripper: Optional[RegionStripper] = None, profiler: Optional[Profiler] = None) -> int:
+    """Replaces the tool changes of a G-code file by the halt block of a template.
+
+    If a stripper is given, the prime tower and ooze shield are removed first.
+    If a reorderer is given, the extruder segments of the layers are reordered
+    next. The tool changes at the (layer number, offset) positions in
+    `removed`, with the layers as read by read_layers, are removed instead.
+    The header is written at the end of the first layer, before the first
+    ";LAYER:" marker. If a cache is given, unchanged layers are taken from it.
+
+    The output is written layer by layer while the input is read, so the memory
+    use does not depend on the size of the file. Layers are rewritten in a
+    background thread while the previous ones are written. The output is
+    written to a temporary file that replaces the output file at the end, so
+    the output file is never left half written. Returns the number of tool
+    changes in the layers as read by read_layers.
+
+    If a profiler is given, the layers are counted and the phases timed:
+    split, strip, reorder, rewrite and join (writing the output). Since
+    cProfile only sees the calling thread, a profiler with cProfile rewrites
+    the layers in the calling thread.
+    """
+    if profiler is None:
+        profiler = Profiler(enabled = False)
+    tool_changes = 0
+
+    def count_tool_changes(layers: Iterable[str]) -> Iterator[str]:
+        nonlocal tool_changes
+        for layer in layers:
+            tool_changes += len(TOOL_CHANGE_LINE.findall(layer))
+            yield layer
+
+    temporary_path = "%s.%d.tmp" % (output_path, os.getpid())
+    try:
+        with open(temporary_path, "w", encoding = ENCODING, errors = ENCODING_ERRORS, newline = "") as output:
+            layers = profiler.count(count_tool_changes(read_layers(input_path, reorderer, stripper, profiler)))
+            if cache is None:
+                rewritten = profiler.timed("rewrite", iter_rewrite_halts(layers, template, removed = removed))
+            else:
+                rewritten = profiler.timed("rewrite", rewrite_cached(layers, template, cache, removed = removed))
+            if profiler.cprofile is None:
+                rewritten = prefetch(rewritten)
+            for layer_number, layer in enumerate(rewritten):
+                with profiler.phase("join"):
+                    output.write(layer)
+                    if layer_number == 0:
+                        output.write(header)
+        os.replace(temporary_path, output_path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+    return tool_changes
@@ -0,0 +1,256 @@
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+import math
+import re
+
+from .elimination import EXTRUDING_MOVE
+from .gcode import put_value
+from .index import TOOL_CHANGE_LINE
+from .zindex import last_value, next_position, word_value
+
+##  The feature type line that starts a region of a layer.
+TYPE_LINE = re.compile(r"^;TYPE:([^\n]*)", re.MULTILINE)
+
+##  A line that ends a region: the next feature type or mesh, a tool change or the end of the layer.
+REGION_END = re.compile(r"^(?:;TYPE:|;MESH:|;TIME_ELAPSED:|T[0-9])", re.MULTILINE)
+
+##  The lines before a region that lead to it: travels and the mesh comment.
+LEAD_IN_LINE = re.compile(r"G0[ \t]|;MESH:")
+
+##  Firmware retraction and unretraction.
+FIRMWARE_RETRACTION = re.compile(r"^G1[01](?![0-9])", re.MULTILINE)
+
+##  M-codes, like fan, temperature and acceleration changes, which are kept when a region is removed.
+MACHINE_COMMAND = re.compile(r"^M[0-9]+[^\n]*", re.MULTILINE)
+
+##  The commands that switch to absolute (M82) or relative (M83) extrusion.
+EXTRUSION_MODE = re.compile(r"^M8([23])(?![0-9])", re.MULTILINE)
+
+##  The layer marker that Cura starts every layer with.
+LAYER_LINE = re.compile(r"^;LAYER:", re.MULTILINE)
+
+##  The feature types that are removed.
+PRIME_TOWER = "PRIME-TOWER"
+OOZE_SHIELD = "SKIRT"
+
+class RegionStripper:
+    """Removes the prime tower and the ooze shield, which are only useful with several nozzles.
+
+    Cura prints the prime tower right after a tool change, as regions of type
+    PRIME-TOWER. The ooze shield is printed as a skirt at the start of every
+    layer, so skirt regions before the first tool change of a layer are
+    removed too, except on the first layer, where they are the skirt or brim.
+    A draft shield looks the same and is removed as well.
+
+    The travels that lead to a region are removed with it. The region is
+    replaced by its M-codes, and by lines that leave the printer in the state
+    it ended in: its extrusion mode, its Z,
+    the position where it ended if the next move extrudes from there, its
+    last firmware retraction command, how far the filament was retracted and
+    its extruder position (G92 E), so the following G-code is not affected.
+    Relative extrusion (M83) is followed across layers.
+    """
+
+    def __init__(self) -> None:
+        self.regions = 0        # the number of regions removed
+        self.extruded = 0.0     # mm of filament saved
+        self.seconds = 0.0      # the print time saved, estimated from the move lengths and feedrates
+        self._first_layer_seen = False
+        self._relative = False  # whether the previous layer ended in relative extrusion mode
+        self._previous_layer = ""
+
+    def strip(self, layer_number: int, layer: str) -> str:
+        """The layer without its prime tower and ooze shield regions."""
+        first_layer = False
+        if not self._first_layer_seen and LAYER_LINE.search(layer) is not None:
+            self._first_layer_seen = first_layer = True
+
+        regions = self._find_regions(layer, first_layer)
+        previous_layer, self._previous_layer = self._previous_layer, layer
+        relative = self._relative
+        self._relative = self._extrusion_mode(layer, len(layer), relative)
+        if not regions:
+            return layer
+
+        parts = []
+        position = 0
+        for start, end in regions:
+            region_relative = self._extrusion_mode(layer, start, relative)
+            retracted = retraction(layer, 0, start, region_relative)
+            if retracted is None:
+                # Nothing was extruded before the region in this layer, so the retraction may have started in the previous one
+                retracted = retraction(previous_layer + layer, 0, len(previous_layer) + start, region_relative) or 0.0
+            retracted_after = self._add_usage(layer, start, end, region_relative, retracted)
+            parts.append(layer[position:start])
+            parts.append(self._restore_state(layer, start, end, region_relative, self._extrusion_mode(layer, end, relative), retracted - retracted_after))
+            position = end
+        parts.append(layer[position:])
+        self.regions += len(regions)
+        return "".join(parts)
+
+    def strip_layers(self, layers: Iterable[str]) -> Iterator[str]:
+        """Strips a stream of layers."""
+        for layer_number, layer in enumerate(layers):
+            yield self.strip(layer_number, layer)
+
+    def _find_regions(self, layer: str, first_layer: bool) -> List[Tuple[int, int]]:
+        """The (start, end) offsets of the regions to remove."""
+        first_tool_change = TOOL_CHANGE_LINE.search(layer)
+        shield_end = len(layer) if first_tool_change is None else first_tool_change.start()
+
+        regions: List[Tuple[int, int]] = []
+        for match in TYPE_LINE.finditer(layer):
+            feature = match.group(1).strip()
+            if feature != PRIME_TOWER and (feature != OOZE_SHIELD or first_layer or match.start() > shield_end):
+                continue
+
+            end_match = REGION_END.search(layer, match.end())
+            end = len(layer) if end_match is None else end_match.start()
+            lower = regions[-1][1] if regions else 0
+            start = self._lead_in_start(layer, lower, match.start())
+            if regions and start == lower:
+                # Adjacent regions are removed together, to restore the state only once
+                start = regions.pop()[0]
+            regions.append((start, end))
+        return regions
+
+    def _lead_in_start(self, layer: str, lower: int, start: int) -> int:
+        """The offset of the first of the travel and mesh lines directly before a region, searching back to `lower`."""
+        while start > lower:
+            line_start = max(layer.rfind("\n", lower, start - 1) + 1, lower)
+            if not LEAD_IN_LINE.match(layer, line_start, start):
+                break
+            start = line_start
+        return start
+
+    def _extrusion_mode(self, layer: str, end: int, relative: bool) -> bool:
+        """Whether the extrusion is relative at the `end` offset of a layer that started in the given mode."""
+        for match in EXTRUSION_MODE.finditer(layer, 0, end):
+            relative = match.group(1) == "3"
+        return relative
+
+    def _restore_state(self, layer: str, start: int, end: int, relative_before: bool, relative: bool, prime: float) -> str:
+        """The G-code that replaces a removed region, which primed the filament by `prime` mm (retracted it if negative)."""
+        restore = ""
+        for match in MACHINE_COMMAND.finditer(layer, start, end):
+            if EXTRUSION_MODE.match(match.group(0)) is None:
+                restore += match.group(0) + "\n"
+        if relative != relative_before:
+            restore += put_value(M = 83 if relative else 82) + "\n"
+
+        words = {}
+        move = next_position(layer, end)
+        if move is not None and move.extrudes:
+            for key in "XY":
+                value = last_value(layer, key, start, end)
+                if value is not None:
+                    words[key] = value
+        z = last_value(layer, "Z", start, end)
+        if z is not None:
+            words["Z"] = z
+        if words:
+            restore += put_value(G = 0, **words) + " ; restore the position after the removed region\n"
+
+        retractions = [match.group(0) for match in FIRMWARE_RETRACTION.finditer(layer, start, end)]
+        if retractions:
+            restore += retractions[-1] + "\n"
+
+        prime = _round(prime)
+        if relative:
+            if prime:
+                restore += put_value(G = 1, E = prime) + " ; restore the retraction after the removed region\n"
+            return restore
+        e = last_value(layer, "E", start, end)
+        if e is not None:
+            if prime:
+                # Set the extruder position so that the move to it primes or retracts the filament
+                restore += put_value(G = 92, E = _round(e - prime)) + "\n"
+                restore += put_value(G = 1, E = e) + " ; restore the retraction after the removed region\n"
+            else:
+                restore += put_value(G = 92, E = e) + " ; restore the extruder position after the removed region\n"
+        return restore
+
+    def _add_usage(self, layer: str, start: int, end: int, relative: bool, retracted: float) -> float:
+        """Adds the filament and time of the moves of a region to the savings.
+
+        Returns how far the filament is retracted at the end of the region,
+        given how far it was retracted at its start.
+        """
+        x = last_value(layer, "X", 0, start)
+        y = last_value(layer, "Y", 0, start)
+        z = last_value(layer, "Z", 0, start)
+        e = last_value(layer, "E", 0, start)
+        feedrate = last_value(layer, "F", 0, start)
+        for line in layer[start:end].split("\n"):
+            code = line.split(";", 1)[0]
+            mode = EXTRUSION_MODE.match(code)
+            if mode is not None:
+                relative = mode.group(1) == "3"
+                continue
+            if code.startswith("G92"):
+                reset = word_value(code, "E")
+                e = e if reset is None else reset
+                continue
+            if not code.startswith(("G0 ", "G1 ")):
+                continue
+
+            feedrate = word_value(code, "F") or feedrate
+            new_x, new_y, new_z, new_e = (word_value(code, key) for key in "XYZE")
+            length = math.sqrt(_distance(x, new_x) ** 2 + _distance(y, new_y) ** 2 + _distance(z, new_z) ** 2)
+            extruded = (new_e or 0.0) if relative else _distance(e, new_e)
+            self.extruded += extruded   # retractions and primes cancel out
+            if feedrate:
+                self.seconds += (length or abs(extruded)) / (feedrate / 60)
+            if new_e is not None and not relative:
+                e = new_e
+            if extruded > 0 and (new_x is not None or new_y is not None):
+                retracted = 0.0
+            else:
+                retracted -= extruded
+            x, y, z = (old if new is None else new for old, new in ((x, new_x), (y, new_y), (z, new_z)))
+        return retracted
+
+def retraction(layer: str, start: int, end: int, relative: bool = False) -> Optional[float]:
+    """How far the filament is retracted at the `end` offset, None if nothing is extruded between the offsets.
+
+    This is how far the extruder moved back after the last extruding move,
+    following G92 resets in absolute and the E values in relative extrusion.
+    """
+    last_move = None
+    for last_move in EXTRUDING_MOVE.finditer(layer, start, end):
+        pass
+    if last_move is None:
+        return None
+
+    line_end = layer.find("\n", last_move.start(), end)
+    line_end = end if line_end < 0 else line_end
+    e = word_value(layer[last_move.start():line_end].split(";", 1)[0], "E")
+    retracted = 0.0
+    for line in layer[line_end:end].split("\n"):
+        code = line.split(";", 1)[0]
+        if code.startswith("G92"):
+            reset = word_value(code, "E")
+            e = e if reset is None else reset
+        elif code.startswith(("G0 ", "G1 ")):
+            new_e = word_value(code, "E")
+            if new_e is None:
+                continue
+            retracted -= new_e if relative else _distance(e, new_e)
+            e = new_e
+    return retracted
+
+def _round(value: float) -> Union[int, float]:
+    """A value rounded to the precision of the extruder positions, as an int if it is integral."""
+    value = round(value, 5)
+    return int(value) if value == int(value) else value
+
+def _distance(old: Optional[float], new: Optional[float]) -> float:
+    if old is None or new is None:
+        return 0.0
+    return new - old
+
+def strip_regions(data: List[str]) -> RegionStripper:
+    """Removes the prime tower and ooze shield regions of all layers in place, returning the stripper with the savings."""
+    stripper = RegionStripper()
+    for layer_number, layer in enumerate(data):
+        data[layer_number] = stripper.strip(layer_number, layer)
+    return stripper
@@ -0,0 +1,131 @@
+from typing import Callable, Iterable, List, NamedTuple, Optional, TypeVar, Union
+import re
+
+T = TypeVar("T")
+
+##  The number of a G-code word, as read by Script.getValue.
+NUMBER = re.compile(r"-?[0-9]+\.?[0-9]*")
+
+##  The code of a move line, up to its comment.
+MOVE_CODE = re.compile(r"^G[0-3](?![0-9])[^;\n]*", re.MULTILINE)
+
+def parse_number(text: str) -> Union[int, float]:
+    """Converts a G-code number the way Script.getValue does (int if possible)."""
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+def last_value(layer: str, key: str, start: int = 0, end: Optional[int] = None) -> Optional[Union[int, float]]:
+    """The last value of a parameter in the lines of a layer between two offsets, None if there is none.
+
+    A line has a value if the first occurrence of the key comes before any
+    comment and is followed by a number, like Script.getValue(line, key) reads
+    it. The layer is searched backwards from `end`, jumping from one occurrence
+    of the key to the previous one.
+    """
+    if end is None:
+        end = len(layer)
+    while True:
+        position = layer.rfind(key, start, end)
+        if position < 0:
+            return None
+        line_start = layer.rfind("\n", 0, position) + 1
+        first = layer.find(key, line_start, position + 1)
+        if layer.find(";", line_start, first) < 0:
+            match = NUMBER.match(layer, first + 1)
+            if match is not None:
+                return parse_number(match.group(0))
+        end = line_start
+
+def word_value(code: str, key: str) -> Optional[Union[int, float]]:
+    """The value of a parameter in the code of a line (without its comment), None if it has none."""
+    position = code.find(key)
+    if position < 0:
+        return None
+    match = NUMBER.match(code, position + 1)
+    return None if match is None else parse_number(match.group(0))
+
+class Move(NamedTuple):
+    """A move that sets X and Y."""
+    x: Union[int, float]
+    y: Union[int, float]
+    z: Optional[Union[int, float]]  # None if the move does not set Z
+    extrudes: bool
+
+def next_position(layer: str, start: int = 0) -> Optional[Move]:
+    """The first move after the `start` offset of a layer that sets X and Y, None if there is none.
+
+    Only the move lines after `start` are looked at, and the search stops at
+    the first match, which usually is a few lines below the offset.
+    """
+    for match in MOVE_CODE.finditer(layer, start):
+        code = match.group(0)
+        x = word_value(code, "X")
+        y = word_value(code, "Y")
+        if x is not None and y is not None:
+            return Move(x, y, word_value(code, "Z"), word_value(code, "E") is not None)
+    return None
+
+def last_z(layer: str, end: Optional[int] = None) -> Optional[Union[int, float]]:
+    """The last Z set in a layer before the `end` offset, None if no line sets Z."""
+    return last_value(layer, "Z", 0, end)
+
+class LayerValueIndex:
+    """A value that carries over from layer to layer, at the start of each layer.
+
+    `last(layer, end)` returns the last value set in a layer before an offset,
+    or None. Every layer is scanned once to record the last value it sets. The
+    value at an offset is then found by only looking inside that layer,
+    falling back to the value the layer started at. Before any value is set,
+    the value is `start`.
+    """
+
+    def __init__(self, last: Callable[[str, Optional[int]], Optional[T]], data: Iterable[str] = (), start: Optional[T] = None) -> None:
+        self._last = last
+        self._layers: List[str] = []
+        self._start: List[Optional[T]] = []
+        self._value = start
+        for layer in data:
+            self.add_layer(layer)
+
+    def add_layer(self, layer: str) -> None:
+        """Appends the next layer."""
+        self._layers.append(layer)
+        self._start.append(self._value)
+        value = self._last(layer, None)
+        if value is not None:
+            self._value = value
+
+    @property
+    def current_value(self) -> Optional[T]:
+        """The value at the end of the last added layer."""
+        return self._value
+
+    def start_value(self, layer_number: int) -> Optional[T]:
+        """The value at the start of a layer."""
+        return self._start[layer_number]
+
+    def value_at(self, layer_number: int, offset: int) -> Optional[T]:
+        """The value that is active at an offset of a layer."""
+        value = self._last(self._layers[layer_number], offset)
+        return self._start[layer_number] if value is None else value
+
+class LayerZIndex(LayerValueIndex):
+    """The Z at the start of each layer. Before any Z is set, Z is `start_z`."""
+
+    def __init__(self, data: Iterable[str] = (), start_z: Union[int, float] = 0) -> None:
+        super().__init__(last_z, data, start_z)
+
+    @property
+    def current_z(self) -> Union[int, float]:
+        """The Z at the end of the last added layer."""
+        return self.current_value
+
+    def start_z(self, layer_number: int) -> Union[int, float]:
+        """The Z at the start of a layer."""
+        return self.start_value(layer_number)
+
+    def z_at(self, layer_number: int, offset: int) -> Union[int, float]:
+        """The Z that is active at an offset of a layer."""
+        return self.value_at(layer_number, offset)
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from multicolor_single_extruder.batch import load_profile
+
+def profile(tmp_path, values) -> str:
+    path = tmp_path / "profile.json"
+    path.write_text(json.dumps(values))
+    return str(path)
+
+def test_profile_values_are_converted_to_the_setting_types(tmp_path):
+    settings = load_profile("pause", profile(tmp_path, {
+        "disarm_timeout": "5",
+        "unload_amount": "300",
+        "remove_redundant_tool_changes": "false",
+        "machine_firmware_retract": "true",
+        "pause_method": "marlin",
+    }))
+    assert settings["disarm_timeout"] == 5
+    assert settings["unload_amount"] == 300.0
+    assert settings["remove_redundant_tool_changes"] is False
+    assert settings["machine_firmware_retract"] is True
+    assert settings["pause_method"] == "marlin"
+
+def test_profile_values_of_the_setting_types_are_kept(tmp_path):
+    settings = load_profile("pause", profile(tmp_path, {"disarm_timeout": 5, "remove_redundant_tool_changes": False}))
+    assert settings["disarm_timeout"] == 5
+    assert settings["remove_redundant_tool_changes"] is False
+
+@pytest.mark.parametrize("values", [
+    {"disarm_timeout": "five"},
+    {"pause_method": "unknown"},
+    {"unknown_setting": 1},
+    {"remove_redundant_tool_changes": 1},
+    {"remove_redundant_tool_changes": "1"},
+    {"remove_redundant_tool_changes": "yes"},
+    {"remove_redundant_tool_changes": "ture"},
+    {"remove_redundant_tool_changes": None},
+    {"machine_firmware_retract": "no"},
+])
+def test_invalid_profiles_are_rejected(tmp_path, values):
+    with pytest.raises(ValueError):
+        load_profile("pause", profile(tmp_path, values))
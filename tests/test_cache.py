@@ -0,0 +1,41 @@
+import os
+
+from multicolor_single_extruder import HaltTemplate, LayerCache, LayerState, rewrite_cached
+
+TEMPLATE = HaltTemplate("M600\n")
+
+def rewrite_twice(tmp_path, layers, removed = frozenset(), template = TEMPLATE, second_template = TEMPLATE):
+    """Rewrites the layers with an empty cache and again with the filled cache."""
+    cache = LayerCache(str(tmp_path))
+    first = list(rewrite_cached(layers, template, cache, removed = removed))
+    cache = LayerCache(str(tmp_path))
+    second = list(rewrite_cached(layers, second_template, cache, removed = removed))
+    # Only the layers with tool changes are cached
+    assert cache.hits == sum("T" in layer for layer in layers) and cache.misses == 0
+    return first, second
+
+def test_rewritten_layers_are_reused(tmp_path):
+    layers = ["T0\nG1 X1 Y1 E1\n", "G1 X2 Y2 E2\n", "T1\nG1 X3 Y3 E3\n"]
+    first, second = rewrite_twice(tmp_path, layers)
+    assert first == second == ["T0\nG1 X1 Y1 E1\n", "G1 X2 Y2 E2\n", "M600\nG1 X3 Y3 E3\n"]
+    assert len(os.listdir(tmp_path)) == 2
+
+def test_layer_rewritten_to_nothing(tmp_path):
+    # A layer that only holds a redundant tool change is removed completely
+    layers = ["T0\nG1 X1 Y1 E1\n", "T1\n", "G1 X2 Y2 E2\n"]
+    first, second = rewrite_twice(tmp_path, layers, removed = {(1, 0)})
+    assert first == second == ["T0\nG1 X1 Y1 E1\n", "", "G1 X2 Y2 E2\n"]
+
+def test_entries_are_reused_with_other_settings(tmp_path):
+    layers = ["T0\nG1 Z0.2\nG1 X1 Y1 E1\n", "G1 Z0.4\nT1\nG1 X3 Y3 E3\n"]
+    lift = HaltTemplate("M600\n", "G1 Z{}\n")
+    first, second = rewrite_twice(tmp_path, layers, template = lift, second_template = HaltTemplate("M0\n", "G1 Z{}\n"))
+    assert first[1] == "G1 Z0.4\nM600\nG1 Z1.4\nG1 X3 Y3 E3\n"
+    assert second[1] == "G1 Z0.4\nM0\nG1 Z1.4\nG1 X3 Y3 E3\n"
+
+def test_unreadable_entries_are_misses(tmp_path):
+    cache = LayerCache(str(tmp_path))
+    key = cache.key("T1\n", LayerState(True, 0), TEMPLATE)
+    (tmp_path / key).write_text("+M600\n")
+    assert cache.get(key) is None
+    assert cache.misses == 1
@@ -0,0 +1,52 @@
+from typing import List, Tuple
+
+from multicolor_single_extruder import ToolChangeIndex, redundant_tool_changes
+
+def redundant_lines(layers: List[str]) -> List[Tuple[int, str]]:
+    """The redundant tool changes as (layer number, line), in order."""
+    removed = redundant_tool_changes(layers)
+    assert removed == redundant_tool_changes(layers, ToolChangeIndex(layers))
+    return sorted((layer_number, layers[layer_number][offset:].split("\n", 1)[0]) for layer_number, offset in removed)
+
+def test_tool_changes_that_change_the_tool_are_kept():
+    layers = [
+        "T0\nG1 X1 Y1 E1\n",
+        "T1\nG92 E0\nG1 X2 Y2 E1\n",
+        "T0\nG92 E0\nG1 X3 Y3 E1\n",
+    ]
+    assert redundant_lines(layers) == []
+
+def test_change_to_the_active_tool_is_redundant():
+    layers = [
+        "T0\nG1 X1 Y1 E1\n",
+        "T0 ; again\nG1 X2 Y2 E2\n",
+    ]
+    assert redundant_lines(layers) == [(1, "T0 ; again")]
+
+def test_back_to_back_tool_changes():
+    # Nothing is printed with T1, and T0 then selects the tool that is still active
+    layers = ["T0\nG1 X1 Y1 E1\nT1\nT0\nG1 X2 Y2 E2\n"]
+    assert redundant_lines(layers) == [(0, "T0"), (0, "T1")]
+
+def test_back_to_back_tool_changes_to_another_tool():
+    layers = ["T0\nG1 X1 Y1 E1\nT1\nT2\nG1 X2 Y2 E2\n"]
+    assert redundant_lines(layers) == [(0, "T1")]
+
+def test_final_pending_tool_change_is_redundant():
+    layers = [
+        "T0\nG1 X1 Y1 E1\n",
+        "T1\nG1 E-1\nG0 X0 Y0\n;End of Gcode\n",
+    ]
+    assert redundant_lines(layers) == [(1, "T1")]
+
+def test_primes_without_moves_do_not_count_as_printing():
+    layers = [
+        "T0\nG1 X1 Y1 E1\n",
+        "T1\nG92 E0\nG1 F1500 E5\nG1 E6\n",
+        "T0\nG92 E0\nG1 X2 Y2 E1\n",
+    ]
+    assert redundant_lines(layers) == [(1, "T1"), (2, "T0")]
+
+def test_first_tool_change_is_never_redundant():
+    layers = ["T1\nG1 E5\n", "T1\nG1 X1 Y1 E6\n"]
+    assert redundant_lines(layers) == [(1, "T1")]
@@ -0,0 +1,22 @@
+from multicolor_single_extruder import build_pause_template, default_settings, PAUSE_AT_HEIGHT_SETTINGS
+
+def pause_template(**settings):
+    values = dict(default_settings(PAUSE_AT_HEIGHT_SETTINGS), machine_firmware_retract = False, machine_nozzle_temp_enabled = True)
+    values.update(settings)
+    return build_pause_template(values)
+
+def test_standby_temperature_is_set_during_the_pause():
+    block = pause_template(pause_method = "marlin", standby_temperature = 150).render(1.0)
+    assert "M104 S150 ; standby temperature\n" in block
+    assert block.index("M104 S150") < block.index("M0 ; Do the actual pause")
+
+def test_reheating_skips_the_standby_temperature():
+    block = pause_template(pause_method = "marlin", standby_temperature = 150, reheat_during_pause = True).render(1.0, temperature = 210)
+    assert "M104 S150" not in block
+    assert block.count("M104 S210") == 1
+    assert block.index("M104 S210") < block.index("M0 ; Do the actual pause") < block.index("M109 S210")
+
+def test_standby_temperature_is_kept_if_the_print_temperature_is_unknown():
+    block = pause_template(pause_method = "marlin", standby_temperature = 150, reheat_during_pause = True).render(1.0)
+    assert "M104 S150 ; standby temperature\n" in block
+    assert "M109" not in block
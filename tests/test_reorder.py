@@ -0,0 +1,93 @@
+from typing import List
+
+from multicolor_single_extruder import FILAMENT_CHANGE_SETTINGS, SegmentReorderer, build_filament_change_template, default_settings, redundant_tool_changes, reorder_segments, rewrite_file, scan_layer
+
+FIRST_LAYER = ";LAYER:0\nT1\nG92 E0\nG1 X90 Y90 E1\n"
+
+def reordered_layer(tool_0_end: str, tool_1_end: str) -> str:
+    """Reorders a layer that prints tool 0 and then tool 1, after a layer that ended with tool 1."""
+    layer = (
+        ";LAYER:1\nG0 Z0.4\n"
+        "T0\nG92 E0\nG1 F1500 E0\nG1 X10 Y10 E1\nG1 X20 Y10 E2\n" + tool_0_end +
+        "T1\nG92 E0\nG1 F1500 E0\nG1 X90 Y80 E1.5\n" + tool_1_end
+    )
+    data = [FIRST_LAYER, layer]
+    assert reorder_segments(data) == 1
+    assert data[1].startswith(";LAYER:1\nG0 Z0.4\nG92 E0\nG1 F1500 E0\nG1 X90 Y80 E1.5\n")
+    assert data[1].count("T") == 1
+    return data[1]
+
+def test_retracted_segment_moved_after_a_retracted_one():
+    # Both segments end retracted by 6.5 mm, so only the extruder position is restored
+    layer = reordered_layer("G1 F1500 E-4.5\n", "G1 F1500 E-5\n")
+    assert "prime" not in layer and "retract after" not in layer
+    assert layer.endswith("G1 F1500 E-4.5\nG92 E-5 ; restore the extruder position after reordering\n")
+
+def test_unretracted_segment_moved_after_a_retracted_one():
+    layer = reordered_layer("G1 F1500 E-4.5\n", "")
+    assert layer.endswith("G1 F1500 E-4.5\nG1 F1500 E2 ; prime after reordering\nG92 E1.5 ; restore the extruder position after reordering\n")
+
+def test_retracted_segment_moved_after_an_unretracted_one():
+    layer = reordered_layer("", "G1 F1500 E-5\n")
+    assert layer.endswith("G1 X20 Y10 E2\nG1 F1500 E-4.5 ; retract after reordering\nG92 E-5 ; restore the extruder position after reordering\n")
+
+def alternating_layers(count: int) -> List[str]:
+    """Layers that all print tool 0 and then tool 1, like Cura slices two colors side by side."""
+    layers = []
+    for layer_number in range(count):
+        layers.append(
+            ";LAYER:%d\nG0 Z%.1f\n" % (layer_number, 0.2 * (layer_number + 1)) +
+            "T0\nG92 E0\nG1 X10 Y10 E1\nG1 F1500 E-4\n"
+            "T1\nG92 E0\nG1 F1500 E0\nG1 X90 Y90 E1\nG1 F1500 E-4\n"
+        )
+    return layers
+
+def tool_changes(layers: List[str]) -> int:
+    return sum(len(scan_layer(layer_number, layer)) for layer_number, layer in enumerate(layers))
+
+def test_alternating_layers_need_one_swap_per_layer():
+    layers = alternating_layers(10)
+    assert tool_changes(layers) - 1 == 19
+
+    saved = reorder_segments(layers)
+    # The first layer keeps its swap, every other layer has one swap left
+    assert tool_changes(layers) - 1 == 10
+    assert saved == 9
+    assert redundant_tool_changes(layers) == set()
+
+def test_leading_tool_change_to_the_active_tool_is_removed():
+    reorderer = SegmentReorderer()
+    reorderer.reorder(0, FIRST_LAYER)
+    layer = ";LAYER:1\nT1\nG92 E0\nG1 X90 Y91 E1\nT0\nG92 E0\nG1 X10 Y10 E1\n"
+    assert reorderer.reorder(1, layer) == ";LAYER:1\nG92 E0\nG1 X90 Y91 E1\nT0\nG92 E0\nG1 X10 Y10 E1\n"
+    assert reorderer.saved == 1
+    assert reorderer.tool == 0
+
+def test_overlapping_segments_are_not_moved():
+    layer = ";LAYER:1\nT0\nG92 E0\nG1 X80 Y80 E1\nG1 X95 Y95 E2\nT1\nG92 E0\nG1 X90 Y90 E1\n"
+    data = [FIRST_LAYER, layer]
+    assert reorder_segments(data) == 0
+    assert data[1] == layer
+
+END_GCODE = "G91 ;Relative positioning\nG1 E-2 F2700\nG1 Z0.2 F2400\nG90\nM140 S0\nM84 X Y E\nM82\nM104 S0\n;End of Gcode\n"
+
+def test_end_gcode_stays_at_the_end_of_a_reordered_file(tmp_path):
+    input_path = tmp_path / "input.gcode"
+    output_path = tmp_path / "output.gcode"
+    # The streaming reader keeps the end G-code in the last layer
+    input_path.write_text(
+        ";FLAVOR:Marlin\n" + FIRST_LAYER.replace("T1", "T0") + ";TIME_ELAPSED:10\n"
+        ";LAYER:1\nG0 Z0.4\n"
+        "T1\nG92 E0\nG1 X10 Y10 E1\nG1 F1500 E-5\n"
+        "T0\nG92 E0\nG1 X90 Y80 E1.5\n"
+        ";TIME_ELAPSED:20\n" + END_GCODE
+    )
+    reorderer = SegmentReorderer()
+    settings = default_settings(FILAMENT_CHANGE_SETTINGS)
+    rewrite_file(str(input_path), str(output_path), build_filament_change_template(settings), reorderer = reorderer)
+    output = output_path.read_text()
+    assert reorderer.saved == 1
+    assert output.endswith(";TIME_ELAPSED:20\n" + END_GCODE)
+    layer = output[output.index(";LAYER:1"):output.index(";TIME_ELAPSED:20")]
+    assert layer.index("G1 X90 Y80 E1.5") < layer.index("M600") < layer.index("G1 X10 Y10 E1")
+    assert "M84" not in layer and "M104 S0" not in layer
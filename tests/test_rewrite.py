@@ -0,0 +1,34 @@
+from multicolor_single_extruder import ToolChange, build_pause_template, default_settings, PAUSE_AT_HEIGHT_SETTINGS, resume_position, rewrite_halts
+
+FIRST_LAYER = "T0\nG1 X5 Y5 E1\n"
+
+RETURN_LINE = "G0 F9000 X{} Y{} ; travel back to where the print resumes\nG0 F300 Z0.4\n"
+
+def paused_layer(layer: str, pause_method: str = "marlin") -> str:
+    """The second layer, with its tool change replaced by the pause block of a pause method."""
+    settings = dict(default_settings(PAUSE_AT_HEIGHT_SETTINGS), machine_firmware_retract = False, machine_nozzle_temp_enabled = True, pause_method = pause_method)
+    assert settings["return_to_print"]
+    return rewrite_halts([FIRST_LAYER, layer], build_pause_template(settings))[1]
+
+def test_return_to_the_next_travel():
+    layer = paused_layer(";LAYER:1\nG0 Z0.4\nG1 X10 Y20 E2\nT1\nG0 X50 Y60\nG1 X55 Y60 E3\n")
+    assert RETURN_LINE.format(50, 60) + "M82\nG0 X50 Y60\n" in layer
+
+def test_return_to_the_position_before_the_tool_change_if_the_next_move_extrudes():
+    layer = paused_layer(";LAYER:1\nG0 Z0.4\nG1 X10 Y20 E2\nT1\nG1 X55 Y60 E3\n")
+    assert RETURN_LINE.format(10, 20) + "M82\nG1 X55 Y60 E3\n" in layer
+
+def test_no_return_if_the_position_is_not_known():
+    layer = ";LAYER:1\nG0 Z0.4\nT1\nG1 X55 Y60 E3\n"
+    assert resume_position(layer, ToolChange(1, layer.index("T1"), layer.index("G1"), 1)) is None
+    assert "travel back" not in paused_layer(layer)
+
+def test_griffin_has_no_return():
+    layer = paused_layer(";LAYER:1\nG0 Z0.4\nG1 X10 Y20 E2\nT1\nG0 X50 Y60\nG1 X55 Y60 E3\n", "griffin")
+    assert "travel back" not in layer
+    assert "G0 F300 Z0.4" not in layer
+
+def test_return_comes_before_switching_back_to_absolute_extrusion():
+    layer = paused_layer(";LAYER:1\nG0 Z0.4\nG1 X10 Y20 E2\nT1\nG0 X50 Y60\nG1 X55 Y60 E3\n")
+    assert layer.index("M83") < layer.index("M0 ; Do the another pause") < layer.index("travel back") < layer.index("M82")
+    assert layer.count("M82") == 1
@@ -0,0 +1,55 @@
+from multicolor_single_extruder import RegionStripper, strip_regions
+
+HEADER = ";FLAVOR:Marlin\nM82 ;absolute extrusion mode\n"
+
+def stripped(layer: str, header: str = HEADER) -> str:
+    data = [header, layer]
+    stripper = strip_regions(data)
+    assert stripper.regions == 1
+    return data[1]
+
+def test_prime_of_the_removed_prime_tower_is_restored():
+    # The filament is retracted before the tool change, and primed again by the prime tower
+    layer = stripped(
+        ";LAYER:1\nG1 F1500 X10 Y10 E5\nG1 F2700 E-1.5\nT1\n"
+        ";TYPE:PRIME-TOWER\nG1 F2700 E5\nG1 F1200 X90 Y90 E6\nG1 F2700 E-0.5\nG1 F2700 E6\n"
+        ";TYPE:WALL-OUTER\nG1 F1200 X20 Y20 E7\n"
+    )
+    assert layer == (
+        ";LAYER:1\nG1 F1500 X10 Y10 E5\nG1 F2700 E-1.5\nT1\n"
+        "G0 X90 Y90 ; restore the position after the removed region\nG92 E-0.5\nG1 E6 ; restore the retraction after the removed region\n"
+        ";TYPE:WALL-OUTER\nG1 F1200 X20 Y20 E7\n"
+    )
+
+def test_extruder_position_is_restored_if_the_retraction_is_unchanged():
+    layer = stripped(
+        ";LAYER:1\nG1 F1500 X10 Y10 E5\nG1 F2700 E3\nT1\n"
+        ";TYPE:PRIME-TOWER\nG1 F2700 E5\nG1 F1200 X90 Y90 E6\nG1 F2700 E4\nG0 F3000 X95 Y95 Z0.6\n"
+        ";TYPE:WALL-OUTER\nG0 X20 Y20\nG1 F2700 E6\nG1 F1200 X30 Y20 E7\n"
+    )
+    assert "F3000" not in layer
+    assert "T1\nG0 Z0.6 ; restore the position after the removed region\nG92 E4 ; restore the extruder position after the removed region\n" in layer
+
+def test_relative_extrusion():
+    stripper = RegionStripper()
+    layers = [stripper.strip(layer_number, layer) for layer_number, layer in enumerate([
+        ";FLAVOR:Marlin\nM83 ;relative extrusion mode\n",
+        ";LAYER:0\nG1 F1500 X10 Y10 E5\n",
+        ";LAYER:1\nG1 F2700 E-1.5\nT1\n;TYPE:PRIME-TOWER\nG1 F2700 E1.5\nG1 F1200 X90 Y90 E2\n;TYPE:WALL-OUTER\nG1 F1200 X20 Y20 E1\n",
+    ])]
+    assert stripper.regions == 1
+    assert stripper.extruded == 3.5
+    # The last move before the retraction extruded in the previous layer; the prime tower primed again
+    assert layers[2] == ";LAYER:1\nG1 F2700 E-1.5\nT1\nG0 X90 Y90 ; restore the position after the removed region\nG1 E1.5 ; restore the retraction after the removed region\n;TYPE:WALL-OUTER\nG1 F1200 X20 Y20 E1\n"
+
+def test_machine_commands_of_the_removed_region_are_kept():
+    layer = stripped(
+        ";LAYER:1\nG1 F1500 X10 Y10 E5\nT1\n"
+        ";TYPE:PRIME-TOWER\nM106 S255\nM104 T0 S175\nG1 F1200 X90 Y90 E6\nM204 S500\nM83\n"
+        ";TYPE:WALL-OUTER\nG0 X20 Y20\nG1 X30 Y20 E1\n"
+    )
+    assert layer == (
+        ";LAYER:1\nG1 F1500 X10 Y10 E5\nT1\n"
+        "M106 S255\nM104 T0 S175\nM204 S500\nM83\n"
+        ";TYPE:WALL-OUTER\nG0 X20 Y20\nG1 X30 Y20 E1\n"
+    )